@@ -1,7 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 from .endpoints import equipment, sensors, data, monitoring, integration
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # Include all endpoint routers
 router.include_router(equipment.router, prefix="/equipment", tags=["equipment"])
@@ -1,16 +1,95 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, and_, select, text, bindparam, cast, tuple_, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
+from uuid import UUID
+import logging
 
 from app.database.connection import get_db
+from app.database.rollups import ROLLUP_VIEWS, ROLLUP_AGG_COLUMNS
 from app.models import Equipment, Sensor, SensorData, DataProcessingJob
+from app.services.processing.anomaly import StreamingZScoreDetector
+from app.services.processing.export import run_export_job
 from pydantic import BaseModel
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Interval -> (date_trunc unit, bucket multiplier); constant lookup instead of
+# per-request string munging, which also mangled multi-unit intervals like '5m'
+_INTERVAL = {
+    "1m": ("minute", 1),
+    "5m": ("minute", 5),
+    "15m": ("minute", 15),
+    "1h": ("hour", 1),
+    "1d": ("day", 1),
+}
+
+def _time_bucket(interval: str):
+    """Build the grouping expression for an aggregation interval"""
+    unit, step = _INTERVAL.get(interval, ("hour", 1))
+    bucket = func.date_trunc(unit, SensorData.timestamp)
+    if step > 1:
+        # Snap truncated minutes down to the nearest N-minute boundary
+        bucket = bucket - (
+            cast(func.extract("minute", SensorData.timestamp), Integer) % step
+        ) * text(f"interval '1 {unit}'")
+    return bucket
+
+async def _query_rollup_view(db: AsyncSession, query: "DataQuery", skip: int, limit: int):
+    """Serve an aggregation query from the matching materialized rollup view.
+
+    Returns the result rows, or None when no view matches the interval or the
+    view is unavailable (caller falls back to aggregating raw sensor_data).
+    """
+    view = ROLLUP_VIEWS.get(query.interval)
+    if view is None:
+        return None
+
+    view_name, _ = view
+    agg_column = ROLLUP_AGG_COLUMNS.get(query.aggregation, "avg_value")
+
+    conditions = []
+    params = {"skip": skip, "limit": limit}
+
+    if query.equipment_ids:
+        conditions.append("equipment_id IN :equipment_ids")
+        params["equipment_ids"] = query.equipment_ids
+
+    if query.sensor_types:
+        conditions.append("sensor_type IN :sensor_types")
+        params["sensor_types"] = query.sensor_types
+
+    if query.start_time:
+        conditions.append("time_bucket >= :start_time")
+        params["start_time"] = query.start_time
+
+    if query.end_time:
+        conditions.append("time_bucket <= :end_time")
+        params["end_time"] = query.end_time
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    stmt = text(
+        f"SELECT equipment_id, sensor_type, time_bucket, {agg_column} AS aggregated_value "
+        f"FROM {view_name} {where_clause} "
+        f"ORDER BY time_bucket DESC OFFSET :skip LIMIT :limit"
+    )
+
+    if query.equipment_ids:
+        stmt = stmt.bindparams(bindparam("equipment_ids", expanding=True))
+    if query.sensor_types:
+        stmt = stmt.bindparams(bindparam("sensor_types", expanding=True))
+
+    try:
+        return (await db.execute(stmt, params)).all()
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"Rollup view {view_name} unavailable, falling back to raw scan: {e}")
+        return None
 
 class DataQuery(BaseModel):
     equipment_ids: Optional[List[str]] = None
@@ -19,6 +98,7 @@ class DataQuery(BaseModel):
     end_time: Optional[datetime] = None
     aggregation: Optional[str] = "raw"  # raw, avg, min, max, count
     interval: Optional[str] = "1h"  # 1m, 5m, 15m, 1h, 1d
+    orient: Optional[str] = "records"  # records (list of dicts) or columns (SoA)
 
 class DataExportRequest(BaseModel):
     equipment_ids: Optional[List[str]] = None
@@ -39,68 +119,123 @@ async def query_sensor_data(
     query: DataQuery,
     skip: int = Query(0, ge=0),
     limit: int = Query(1000, le=10000),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Query and explore sensor data with filtering and aggregation"""
-    
-    # Build base query
-    base_query = db.query(SensorData).join(Equipment).join(Sensor)
-    
-    # Apply filters
+
+    # Shared filter conditions
+    conditions = []
+
     if query.equipment_ids:
-        base_query = base_query.filter(Equipment.equipment_id.in_(query.equipment_ids))
-    
+        conditions.append(Equipment.equipment_id.in_(query.equipment_ids))
+
     if query.sensor_types:
-        base_query = base_query.filter(Sensor.type.in_(query.sensor_types))
-    
+        conditions.append(Sensor.type.in_(query.sensor_types))
+
     if query.start_time:
-        base_query = base_query.filter(SensorData.timestamp >= query.start_time)
-    
+        conditions.append(SensorData.timestamp >= query.start_time)
+
     if query.end_time:
-        base_query = base_query.filter(SensorData.timestamp <= query.end_time)
-    
+        conditions.append(SensorData.timestamp <= query.end_time)
+
     # Apply aggregation
     if query.aggregation == "raw":
-        results = base_query.order_by(SensorData.timestamp.desc()).offset(skip).limit(limit).all()
-        
+        # Column projection — no ORM hydration and no per-row lazy loads
+        stmt = select(
+            Equipment.equipment_id,
+            Sensor.type,
+            SensorData.value,
+            SensorData.timestamp,
+            SensorData.quality
+        ).select_from(SensorData).join(Equipment).join(
+            # Explicit ON — the FK chain would join Sensor via Equipment
+            # and emit each data point once per sibling sensor
+            Sensor, SensorData.sensor_id == Sensor.id
+        ).where(
+            *conditions
+        ).order_by(SensorData.timestamp.desc()).offset(skip).limit(limit)
+
+        results = (await db.execute(stmt)).all()
+
+        if query.orient == "columns":
+            # Column-oriented payload: one list per field instead of a dict
+            # per row — far fewer allocations at limit=10000 and smaller JSON
+            cols = list(zip(*results)) if results else [[], [], [], [], []]
+            return {
+                "data": {
+                    "equipment_id": cols[0],
+                    "sensor_type": cols[1],
+                    "value": cols[2],
+                    "timestamp": cols[3],
+                    "quality": cols[4]
+                },
+                "aggregation": "raw",
+                "orient": "columns",
+                "count": len(results)
+            }
+
         return {
             "data": [
                 {
-                    "equipment_id": data.equipment.equipment_id,
-                    "sensor_type": data.sensor.type,
-                    "value": data.value,
-                    "timestamp": data.timestamp,
-                    "quality": data.quality
+                    "equipment_id": equipment_id,
+                    "sensor_type": sensor_type,
+                    "value": value,
+                    "timestamp": timestamp,
+                    "quality": quality
                 }
-                for data in results
+                for equipment_id, sensor_type, value, timestamp, quality in results
             ],
             "aggregation": "raw",
             "count": len(results)
         }
-    
+
     else:
-        # Perform aggregation
+        # Serve from the pre-aggregated rollup view when one matches the interval
+        rollup_results = await _query_rollup_view(db, query, skip, limit)
+        if rollup_results is not None:
+            return {
+                "data": [
+                    {
+                        "equipment_id": row.equipment_id,
+                        "sensor_type": row.sensor_type,
+                        "time_bucket": row.time_bucket,
+                        "value": float(row.aggregated_value),
+                    }
+                    for row in rollup_results
+                ],
+                "aggregation": query.aggregation,
+                "interval": query.interval,
+                "count": len(rollup_results)
+            }
+
+        # Perform aggregation over raw rows
         agg_func = {
             "avg": func.avg(SensorData.value),
             "min": func.min(SensorData.value),
             "max": func.max(SensorData.value),
             "count": func.count(SensorData.value)
         }.get(query.aggregation, func.avg(SensorData.value))
-        
+
         # Time-based grouping
-        time_group = func.date_trunc(query.interval.replace('h', ' hour').replace('m', ' minute').replace('d', ' day'), SensorData.timestamp)
-        
-        results = base_query.with_entities(
+        time_group = _time_bucket(query.interval)
+
+        stmt = select(
             Equipment.equipment_id,
             Sensor.type,
             time_group.label('time_bucket'),
             agg_func.label('aggregated_value')
+        ).select_from(SensorData).join(Equipment).join(
+            Sensor, SensorData.sensor_id == Sensor.id
+        ).where(
+            *conditions
         ).group_by(
             Equipment.equipment_id,
             Sensor.type,
             time_group
-        ).order_by(time_group.desc()).offset(skip).limit(limit).all()
-        
+        ).order_by(time_group.desc()).offset(skip).limit(limit)
+
+        results = (await db.execute(stmt)).all()
+
         return {
             "data": [
                 {
@@ -119,10 +254,11 @@ async def query_sensor_data(
 @router.post("/export")
 async def export_data(
     export_request: DataExportRequest,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
 ):
     """Export sensor data for analysis"""
-    
+
     # Create processing job
     job = DataProcessingJob(
         job_type="export",
@@ -135,14 +271,14 @@ async def export_data(
         time_range_end=export_request.end_time,
         status="PENDING"
     )
-    
+
     db.add(job)
-    db.commit()
-    db.refresh(job)
-    
-    # Here you would typically queue the job for background processing
-    # For now, return job info
-    
+    await db.commit()
+    await db.refresh(job)
+
+    # Stream the export in the background — columnar Arrow writes, constant memory
+    background_tasks.add_task(run_export_job, job.id)
+
     return {
         "job_id": job.job_id,
         "status": "QUEUED",
@@ -155,39 +291,49 @@ async def get_data_statistics(
     equipment_id: Optional[str] = Query(None),
     sensor_type: Optional[str] = Query(None),
     hours: int = Query(24, ge=1, le=168),  # Max 1 week
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get statistical summary of sensor data"""
-    
+
     # Calculate time range
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(hours=hours)
-    
-    # Build query
-    query = db.query(SensorData).join(Equipment).join(Sensor)
-    query = query.filter(SensorData.timestamp >= start_time)
-    
-    if equipment_id:
-        query = query.filter(Equipment.equipment_id == equipment_id)
-    
-    if sensor_type:
-        query = query.filter(Sensor.type == sensor_type)
-    
-    # Get aggregated statistics
-    stats = query.with_entities(
+
+    # Still one round-trip: GROUPING SETS yields the grand-total value
+    # aggregates plus one count row per distinct quality from a single
+    # scan — quality is a free-form String(20), so no enumerating values
+    # the schema doesn't enforce. Equipment/Sensor are only joined (on
+    # the row's own FKs) when their filters are present; unconditional
+    # joins multiplied every aggregate by the sensors-per-equipment count
+    stmt = select(
+        SensorData.quality.label('quality'),
+        func.grouping(SensorData.quality).label('is_total'),
         func.count(SensorData.value).label('count'),
         func.avg(SensorData.value).label('average'),
         func.min(SensorData.value).label('minimum'),
         func.max(SensorData.value).label('maximum'),
-        func.stddev(SensorData.value).label('std_dev')
-    ).first()
-    
-    # Get data quality metrics
-    quality_stats = query.with_entities(
-        SensorData.quality,
-        func.count(SensorData.quality).label('count')
-    ).group_by(SensorData.quality).all()
-    
+        func.stddev_samp(SensorData.value).label('std_dev')
+    ).select_from(SensorData).where(SensorData.timestamp >= start_time)
+
+    if equipment_id:
+        stmt = stmt.join(
+            Equipment, SensorData.equipment_id == Equipment.id
+        ).where(Equipment.equipment_id == equipment_id)
+
+    if sensor_type:
+        stmt = stmt.join(
+            Sensor, SensorData.sensor_id == Sensor.id
+        ).where(Sensor.type == sensor_type)
+
+    rows = (await db.execute(stmt.group_by(
+        func.grouping_sets(tuple_(), tuple_(SensorData.quality))
+    ))).all()
+
+    stats = next(row for row in rows if row.is_total)
+    quality_distribution = {
+        row.quality: row.count for row in rows if not row.is_total and row.count
+    }
+
     return {
         "time_range": {
             "start": start_time,
@@ -205,76 +351,142 @@ async def get_data_statistics(
             "maximum": float(stats.maximum) if stats.maximum else 0,
             "std_deviation": float(stats.std_dev) if stats.std_dev else 0
         },
-        "quality_distribution": {
-            quality.quality: quality.count for quality in quality_stats
-        }
+        "quality_distribution": quality_distribution
     }
 
+async def _detect_anomalies_sql(db: AsyncSession, request: AnomalyDetectionRequest, conditions: list):
+    """Detect anomalies fully in SQL — raw rows never leave the database"""
+
+    # Per-(equipment, sensor type) statistics computed in a single GROUP BY pass
+    stats = select(
+        Equipment.equipment_id.label('equipment_id'),
+        Sensor.type.label('sensor_type'),
+        func.avg(SensorData.value).label('mean'),
+        func.stddev(SensorData.value).label('std'),
+        func.count(SensorData.value).label('count')
+    ).select_from(SensorData).join(Equipment).join(
+        # Explicit ON: the FK chain would otherwise join Sensor to
+        # Equipment and pool every sibling sensor into each type group
+        Sensor, SensorData.sensor_id == Sensor.id
+    ).where(
+        *conditions
+    ).group_by(Equipment.equipment_id, Sensor.type).subquery()
+
+    total_points = await db.scalar(select(func.coalesce(func.sum(stats.c.count), 0))) or 0
+
+    if total_points < 10:
+        return int(total_points), []
+
+    # Second pass: return only the rows outside the per-group threshold band
+    deviation = (func.abs(SensorData.value - stats.c.mean) / stats.c.std).label('deviation')
+
+    anomaly_rows = (await db.execute(select(
+        Equipment.equipment_id,
+        Sensor.type,
+        SensorData.value,
+        SensorData.timestamp,
+        stats.c.mean,
+        stats.c.std,
+        deviation
+    ).select_from(SensorData).join(Equipment).join(
+        Sensor, SensorData.sensor_id == Sensor.id
+    ).join(
+        stats,
+        and_(
+            stats.c.equipment_id == Equipment.equipment_id,
+            stats.c.sensor_type == Sensor.type
+        )
+    ).where(*conditions).where(
+        stats.c.count >= 5,
+        stats.c.std > 0,
+        func.abs(SensorData.value - stats.c.mean) > request.threshold_multiplier * stats.c.std
+    ).order_by(deviation.desc()).limit(50))).all()
+
+    anomalies = []
+    for row in anomaly_rows:
+        mean_val = float(row.mean)
+        std_val = float(row.std)
+        threshold = request.threshold_multiplier * std_val
+
+        anomalies.append({
+            "equipment_id": row.equipment_id,
+            "sensor_type": row.type,
+            "value": row.value,
+            "expected_range": [mean_val - threshold, mean_val + threshold],
+            "deviation": float(row.deviation),
+            "timestamp": row.timestamp,
+            "severity": "HIGH" if abs(row.value - mean_val) > 3 * std_val else "MEDIUM"
+        })
+
+    return int(total_points), anomalies
+
+async def _detect_anomalies_vectorized(db: AsyncSession, request: AnomalyDetectionRequest, conditions: list):
+    """Fallback: two streaming passes through the z-score detector.
+
+    Mirrors the SQL path's shape — pass one folds fixed-size partitions
+    into per-group statistics, pass two re-streams and keeps only rows
+    outside the threshold band — so peak memory is one partition plus
+    the per-group accumulators, never the full result set.
+    """
+
+    stmt = select(
+        Equipment.equipment_id,
+        Sensor.type,
+        SensorData.value,
+        SensorData.timestamp
+    ).select_from(SensorData).join(Equipment).join(
+        Sensor, SensorData.sensor_id == Sensor.id
+    ).where(
+        *conditions
+    ).execution_options(yield_per=10_000)
+
+    detector = StreamingZScoreDetector(request.threshold_multiplier)
+
+    result = await db.stream(stmt)
+    async for partition in result.partitions(10_000):
+        detector.fold(partition)
+    detector.finalize_stats()
+
+    if detector.total_points >= 10:
+        result = await db.stream(stmt)
+        async for partition in result.partitions(10_000):
+            detector.flag(partition)
+
+    return detector.result()
+
 @router.post("/anomaly-detection")
 async def detect_anomalies(
     request: AnomalyDetectionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Detect anomalies in sensor data using statistical methods"""
-    
+
     # Calculate time range
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(hours=request.lookback_hours)
-    
-    # Build query
-    query = db.query(SensorData).join(Equipment).join(Sensor)
-    query = query.filter(SensorData.timestamp >= start_time)
-    
+
+    # Shared filters for both passes
+    conditions = [SensorData.timestamp >= start_time]
+
     if request.equipment_ids:
-        query = query.filter(Equipment.equipment_id.in_(request.equipment_ids))
-    
+        conditions.append(Equipment.equipment_id.in_(request.equipment_ids))
+
     if request.sensor_types:
-        query = query.filter(Sensor.type.in_(request.sensor_types))
-    
-    # Get data for analysis
-    data_points = query.all()
-    
-    if len(data_points) < 10:
+        conditions.append(Sensor.type.in_(request.sensor_types))
+
+    try:
+        total_points, anomalies = await _detect_anomalies_sql(db, request, conditions)
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"SQL-side anomaly statistics unavailable, using vectorized fallback: {e}")
+        total_points, anomalies = await _detect_anomalies_vectorized(db, request, conditions)
+
+    if total_points < 10:
         return {
             "message": "Insufficient data for anomaly detection",
             "anomalies": []
         }
-    
-    # Group by equipment and sensor for individual analysis
-    grouped_data = {}
-    for point in data_points:
-        key = f"{point.equipment.equipment_id}_{point.sensor.type}"
-        if key not in grouped_data:
-            grouped_data[key] = []
-        grouped_data[key].append(point)
-    
-    anomalies = []
-    
-    for key, points in grouped_data.items():
-        if len(points) < 5:
-            continue
-            
-        values = [p.value for p in points]
-        mean_val = np.mean(values)
-        std_val = np.std(values)
-        
-        threshold = request.threshold_multiplier * std_val
-        
-        for point in points:
-            if abs(point.value - mean_val) > threshold:
-                anomalies.append({
-                    "equipment_id": point.equipment.equipment_id,
-                    "sensor_type": point.sensor.type,
-                    "value": point.value,
-                    "expected_range": [mean_val - threshold, mean_val + threshold],
-                    "deviation": abs(point.value - mean_val) / std_val,
-                    "timestamp": point.timestamp,
-                    "severity": "HIGH" if abs(point.value - mean_val) > 3 * std_val else "MEDIUM"
-                })
-    
-    # Sort by deviation (most anomalous first)
-    anomalies.sort(key=lambda x: x["deviation"], reverse=True)
-    
+
     return {
         "analysis_period": {
             "start": start_time,
@@ -282,25 +494,30 @@ async def detect_anomalies(
             "hours": request.lookback_hours
         },
         "threshold_multiplier": request.threshold_multiplier,
-        "total_points_analyzed": len(data_points),
+        "total_points_analyzed": total_points,
         "anomalies_detected": len(anomalies),
-        "anomalies": anomalies[:50]  # Return top 50 anomalies
+        "anomalies": anomalies  # Top 50 anomalies by deviation
     }
 
 @router.get("/jobs/{job_id}")
 async def get_processing_job(
-    job_id: str,
-    db: Session = Depends(get_db)
+    job_id: UUID,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
 ):
     """Get status of a data processing job"""
-    
-    job = db.query(DataProcessingJob).filter(
+
+    job = await db.scalar(select(DataProcessingJob).where(
         DataProcessingJob.job_id == job_id
-    ).first()
-    
+    ))
+
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    
+
+    # Terminal jobs never change again — let clients cache the final state
+    if job.status in ("COMPLETED", "FAILED"):
+        response.headers["Cache-Control"] = "public, max-age=86400, immutable"
+
     return {
         "job_id": job.job_id,
         "job_type": job.job_type,
@@ -311,4 +528,4 @@ async def get_processing_job(
         "records_processed": job.records_processed,
         "result_file_path": job.result_file_path,
         "error_message": job.error_message
-    }
\ No newline at end of file
+    }
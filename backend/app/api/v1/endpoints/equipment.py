@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
+from app.api.v1.endpoints.monitoring import bump_monitoring_rev
 from app.database.connection import get_db
 from app.models import Equipment, Sensor, SensorData
 from pydantic import BaseModel
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # Pydantic models for API
 class EquipmentCreate(BaseModel):
@@ -52,39 +55,40 @@ class EquipmentUpdate(BaseModel):
     connection_config: Optional[dict] = None
     is_active: Optional[bool] = None
 
-@router.get("/", response_model=List[EquipmentResponse])
+@router.get("/", response_model=None)
 async def list_equipment(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=1000),
     protocol: Optional[str] = Query(None),
     is_active: Optional[bool] = Query(None),
     is_connected: Optional[bool] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all industrial equipment with filtering options"""
-    query = db.query(Equipment)
-    
+    stmt = select(Equipment)
+
     if protocol:
-        query = query.filter(Equipment.protocol == protocol)
+        stmt = stmt.where(Equipment.protocol == protocol)
     if is_active is not None:
-        query = query.filter(Equipment.is_active == is_active)
+        stmt = stmt.where(Equipment.is_active == is_active)
     if is_connected is not None:
-        query = query.filter(Equipment.is_connected == is_connected)
-    
-    equipment_list = query.offset(skip).limit(limit).all()
-    return equipment_list
+        stmt = stmt.where(Equipment.is_connected == is_connected)
 
-@router.post("/", response_model=EquipmentResponse)
+    result = await db.execute(stmt.offset(skip).limit(limit))
+    # Validate once here instead of a second FastAPI response_model pass
+    return [EquipmentResponse.model_validate(e) for e in result.scalars().all()]
+
+@router.post("/", response_model=None)
 async def create_equipment(
     equipment: EquipmentCreate,
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_db)
+) -> EquipmentResponse:
     """Register new industrial equipment"""
     # Check if equipment ID already exists
-    existing = db.query(Equipment).filter(
+    existing = await db.scalar(select(Equipment).where(
         Equipment.equipment_id == equipment.equipment_id
-    ).first()
-    
+    ))
+
     if existing:
         raise HTTPException(
             status_code=400,
@@ -94,37 +98,38 @@ async def create_equipment(
     # Create new equipment
     db_equipment = Equipment(**equipment.dict())
     db.add(db_equipment)
-    db.commit()
-    db.refresh(db_equipment)
-    
-    return db_equipment
+    await db.commit()
+    await db.refresh(db_equipment)
+    await bump_monitoring_rev()
+
+    return EquipmentResponse.model_validate(db_equipment)
 
-@router.get("/{equipment_id}", response_model=EquipmentResponse)
+@router.get("/{equipment_id}", response_model=None)
 async def get_equipment(
     equipment_id: str,
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_db)
+) -> EquipmentResponse:
     """Get specific equipment details"""
-    equipment = db.query(Equipment).filter(
+    equipment = await db.scalar(select(Equipment).where(
         Equipment.equipment_id == equipment_id
-    ).first()
-    
+    ))
+
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
-    
-    return equipment
 
-@router.put("/{equipment_id}", response_model=EquipmentResponse)
+    return EquipmentResponse.model_validate(equipment)
+
+@router.put("/{equipment_id}", response_model=None)
 async def update_equipment(
     equipment_id: str,
     equipment_update: EquipmentUpdate,
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_db)
+) -> EquipmentResponse:
     """Update equipment configuration"""
-    equipment = db.query(Equipment).filter(
+    equipment = await db.scalar(select(Equipment).where(
         Equipment.equipment_id == equipment_id
-    ).first()
-    
+    ))
+
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
@@ -132,52 +137,129 @@ async def update_equipment(
     update_data = equipment_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(equipment, field, value)
-    
-    db.commit()
-    db.refresh(equipment)
-    
-    return equipment
+
+    await db.commit()
+    await db.refresh(equipment)
+    await bump_monitoring_rev()
+
+    return EquipmentResponse.model_validate(equipment)
 
 @router.delete("/{equipment_id}")
 async def delete_equipment(
     equipment_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete equipment (soft delete by setting inactive)"""
-    equipment = db.query(Equipment).filter(
+    equipment = await db.scalar(select(Equipment).where(
         Equipment.equipment_id == equipment_id
-    ).first()
-    
+    ))
+
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
     equipment.is_active = False
-    db.commit()
-    
+    await db.commit()
+    await bump_monitoring_rev()
+
     return {"message": f"Equipment {equipment_id} deactivated"}
 
+@router.get("/status/batch")
+async def get_equipment_status_batch(
+    ids: str = Query(..., description="Comma-separated equipment IDs"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get status for multiple equipment in two queries instead of N round-trips"""
+    equipment_ids = [i.strip() for i in ids.split(",") if i.strip()]
+
+    if not equipment_ids:
+        raise HTTPException(status_code=400, detail="No equipment IDs provided")
+
+    equipment_list = (await db.execute(select(Equipment).where(
+        Equipment.equipment_id.in_(equipment_ids)
+    ))).scalars().all()
+
+    # Latest 10 readings per equipment via a single windowed query
+    ranked = select(
+        SensorData.equipment_id,
+        SensorData.sensor_id,
+        SensorData.value,
+        SensorData.timestamp,
+        SensorData.quality,
+        func.row_number().over(
+            partition_by=SensorData.equipment_id,
+            order_by=SensorData.timestamp.desc()
+        ).label('rn')
+    ).where(
+        SensorData.equipment_id.in_([e.id for e in equipment_list])
+    ).subquery()
+
+    reading_rows = (await db.execute(select(
+        ranked.c.equipment_id,
+        ranked.c.sensor_id,
+        ranked.c.value,
+        ranked.c.timestamp,
+        ranked.c.quality
+    ).where(ranked.c.rn <= 10))).all()
+
+    readings_by_equipment = {}
+    for equipment_pk, sensor_id, value, timestamp, quality in reading_rows:
+        readings_by_equipment.setdefault(equipment_pk, []).append({
+            "sensor_id": sensor_id,
+            "value": value,
+            "timestamp": timestamp,
+            "quality": quality
+        })
+
+    # Aware UTC — last_heartbeat comes back tz-aware from the
+    # timezone=True column, and naive-minus-aware raises TypeError
+    now = datetime.now(timezone.utc)
+    statuses = []
+    for equipment in equipment_list:
+        uptime_hours = 0
+        if equipment.last_heartbeat:
+            uptime_hours = (now - equipment.last_heartbeat).total_seconds() / 3600
+
+        statuses.append({
+            "equipment_id": equipment.equipment_id,
+            "is_connected": equipment.is_connected,
+            "last_heartbeat": equipment.last_heartbeat,
+            "uptime_hours": uptime_hours,
+            "protocol": equipment.protocol,
+            "latest_readings": readings_by_equipment.get(equipment.id, [])
+        })
+
+    return {
+        "count": len(statuses),
+        "equipment": statuses
+    }
+
 @router.get("/{equipment_id}/status")
 async def get_equipment_status(
     equipment_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get real-time equipment status"""
-    equipment = db.query(Equipment).filter(
+    equipment = await db.scalar(select(Equipment).where(
         Equipment.equipment_id == equipment_id
-    ).first()
-    
+    ))
+
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
-    # Get latest sensor readings
-    latest_data = db.query(SensorData).filter(
+    # Get latest sensor readings (column projection, no ORM hydration)
+    latest_data = (await db.execute(select(
+        SensorData.sensor_id,
+        SensorData.value,
+        SensorData.timestamp,
+        SensorData.quality
+    ).where(
         SensorData.equipment_id == equipment.id
-    ).order_by(SensorData.timestamp.desc()).limit(10).all()
+    ).order_by(SensorData.timestamp.desc()).limit(10))).all()
     
     # Calculate uptime
     uptime_hours = 0
     if equipment.last_heartbeat:
-        uptime_hours = (datetime.utcnow() - equipment.last_heartbeat).total_seconds() / 3600
+        uptime_hours = (datetime.now(timezone.utc) - equipment.last_heartbeat).total_seconds() / 3600
     
     return {
         "equipment_id": equipment_id,
@@ -187,32 +269,33 @@ async def get_equipment_status(
         "protocol": equipment.protocol,
         "latest_readings": [
             {
-                "sensor_id": data.sensor_id,
-                "value": data.value,
-                "timestamp": data.timestamp,
-                "quality": data.quality
+                "sensor_id": sensor_id,
+                "value": value,
+                "timestamp": timestamp,
+                "quality": quality
             }
-            for data in latest_data
+            for sensor_id, value, timestamp, quality in latest_data
         ]
     }
 
 @router.post("/{equipment_id}/connect")
 async def connect_equipment(
     equipment_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Manually trigger equipment connection"""
-    equipment = db.query(Equipment).filter(
+    equipment = await db.scalar(select(Equipment).where(
         Equipment.equipment_id == equipment_id
-    ).first()
-    
+    ))
+
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
     # Here you would trigger the actual connection logic
     # For now, just update the status
     equipment.is_connected = True
-    equipment.last_heartbeat = datetime.utcnow()
-    db.commit()
-    
+    equipment.last_heartbeat = datetime.now(timezone.utc)
+    await db.commit()
+    await bump_monitoring_rev()
+
     return {"message": f"Connection initiated for equipment {equipment_id}"}
\ No newline at end of file
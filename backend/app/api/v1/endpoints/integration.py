@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, cast, select, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any
 from datetime import datetime
+import orjson
+import time
 
-from app.database.connection import get_db
+from app.database.connection import get_db, get_redis
 from app.models import Equipment
-from app.services.protocols.mqtt.client import MQTTService
-from app.services.protocols.opc_ua.client import OPCUAService
+from app.services.protocols.registry import get_mqtt, get_opcua
 from pydantic import BaseModel
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 class ProtocolTestRequest(BaseModel):
     protocol: str
@@ -24,8 +27,11 @@ class ConnectionStatus(BaseModel):
     error_message: str = None
 
 @router.get("/protocols")
-async def list_supported_protocols():
+async def list_supported_protocols(response: Response):
     """List all supported industrial protocols"""
+    # Static catalogue — let clients and proxies cache it for an hour
+    response.headers["Cache-Control"] = "public, max-age=3600"
+    response.headers["ETag"] = '"protocols-v1"'
     return {
         "supported_protocols": [
             {
@@ -57,22 +63,22 @@ async def list_supported_protocols():
 @router.post("/test-connection")
 async def test_protocol_connection(
     request: ProtocolTestRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Test connection to industrial equipment using specified protocol"""
     
     try:
         if request.protocol.upper() == "MQTT":
-            # Test MQTT connection
-            test_client = MQTTService()
+            # Test MQTT connection using the shared, already-connected client
+            test_client = get_mqtt()
             # Here you would implement actual connection test
             # For now, simulate test result
             success = True
             message = "MQTT connection successful"
-            
+
         elif request.protocol.upper() == "OPC_UA":
-            # Test OPC UA connection
-            test_client = OPCUAService()
+            # Test OPC UA connection using the shared client
+            test_client = get_opcua()
             # Simulate OPC UA connection test
             success = True
             message = "OPC UA connection successful"
@@ -105,41 +111,40 @@ async def test_protocol_connection(
             "response_time_ms": None
         }
 
+CONNECTION_STATUS_KEY = "integration:connection-status"
+CONNECTION_STATUS_TTL = 1  # seconds — monitoring dashboards poll frequently
+
 @router.get("/connection-status")
-async def get_connection_status(db: Session = Depends(get_db)):
+async def get_connection_status(db: AsyncSession = Depends(get_db)):
     """Get current connection status for all protocols"""
-    
-    # Get all active equipment grouped by protocol
-    equipment_by_protocol = db.query(Equipment).filter(
-        Equipment.is_active == True
-    ).all()
-    
+
+    redis = get_redis()
+    try:
+        cached = await redis.get(CONNECTION_STATUS_KEY)
+        if cached:
+            return orjson.loads(cached)
+    except Exception:
+        pass  # Redis unavailable — fall back to SQL
+
+    # Single GROUP BY instead of scanning every equipment row in Python
+    protocol_stats = (await db.execute(select(
+        Equipment.protocol,
+        func.count(Equipment.id).label('total'),
+        func.sum(cast(Equipment.is_connected, Integer)).label('connected'),
+        func.max(Equipment.last_heartbeat).label('last_activity')
+    ).where(Equipment.is_active == True).group_by(Equipment.protocol))).all()
+
     protocol_status = {}
-    
-    for equipment in equipment_by_protocol:
-        protocol = equipment.protocol
-        if protocol not in protocol_status:
-            protocol_status[protocol] = {
-                "total_equipment": 0,
-                "connected": 0,
-                "disconnected": 0,
-                "last_activity": None
-            }
-        
-        protocol_status[protocol]["total_equipment"] += 1
-        
-        if equipment.is_connected:
-            protocol_status[protocol]["connected"] += 1
-        else:
-            protocol_status[protocol]["disconnected"] += 1
-        
-        # Update last activity
-        if equipment.last_heartbeat:
-            if (not protocol_status[protocol]["last_activity"] or 
-                equipment.last_heartbeat > protocol_status[protocol]["last_activity"]):
-                protocol_status[protocol]["last_activity"] = equipment.last_heartbeat
-    
-    return {
+    for row in protocol_stats:
+        connected = int(row.connected or 0)
+        protocol_status[row.protocol] = {
+            "total_equipment": row.total,
+            "connected": connected,
+            "disconnected": row.total - connected,
+            "last_activity": row.last_activity
+        }
+
+    payload = {
         "timestamp": datetime.utcnow(),
         "protocols": protocol_status,
         "summary": {
@@ -149,16 +154,23 @@ async def get_connection_status(db: Session = Depends(get_db)):
         }
     }
 
+    try:
+        await redis.setex(CONNECTION_STATUS_KEY, CONNECTION_STATUS_TTL, orjson.dumps(payload))
+    except Exception:
+        pass
+
+    return payload
+
 @router.get("/opc-ua/browse")
 async def browse_opcua_nodes(
     parent_node: str = "i=85",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Browse OPC UA server nodes for equipment discovery"""
     
     try:
         # This would use the actual OPC UA service
-        opcua_service = OPCUAService()
+        opcua_service = get_opcua()
         
         # Simulate node browsing for demo
         nodes = [
@@ -191,40 +203,51 @@ async def browse_opcua_nodes(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to browse OPC UA nodes: {str(e)}")
 
+# equipment_id -> (protocol, expiry) cache so the publish hot path skips the
+# per-request DB round-trip; short TTL keeps protocol changes visible
+_PROTOCOL_CACHE: Dict[str, tuple] = {}
+_PROTOCOL_CACHE_TTL = 60  # seconds
+
 @router.post("/mqtt/publish")
 async def publish_mqtt_command(
     equipment_id: str,
     command: str,
     payload: Dict[str, Any],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Publish command to equipment via MQTT"""
-    
-    # Find equipment
-    equipment = db.query(Equipment).filter(
-        Equipment.equipment_id == equipment_id,
-        Equipment.protocol == "MQTT"
-    ).first()
-    
-    if not equipment:
+
+    # Resolve the equipment protocol, preferring the cache
+    now = time.monotonic()
+    cached = _PROTOCOL_CACHE.get(equipment_id)
+    if cached and cached[1] > now:
+        protocol = cached[0]
+    else:
+        protocol = await db.scalar(select(Equipment.protocol).where(
+            Equipment.equipment_id == equipment_id
+        ))
+        if protocol:
+            _PROTOCOL_CACHE[equipment_id] = (protocol, now + _PROTOCOL_CACHE_TTL)
+
+    if protocol != "MQTT":
         raise HTTPException(status_code=404, detail="MQTT equipment not found")
-    
+
     try:
-        # This would use the actual MQTT service
-        mqtt_service = MQTTService()
-        
-        # Simulate command publishing
+        mqtt_service = get_mqtt()
+
+        # Enqueue for the background flusher instead of publishing inline
         topic = f"equipment/{equipment_id}/command/{command}"
-        
+        await mqtt_service.enqueue_publish(topic, orjson.dumps(payload).decode())
+
         return {
             "equipment_id": equipment_id,
             "command": command,
             "topic": topic,
             "payload": payload,
-            "status": "published",
+            "status": "queued",
             "timestamp": datetime.utcnow()
         }
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to publish MQTT command: {str(e)}")
 
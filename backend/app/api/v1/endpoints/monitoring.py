@@ -1,14 +1,58 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import Integer, case, cast, func, desc, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+from uuid import UUID
+import asyncio
+import logging
+import orjson
 
-from app.database.connection import get_db
+from app.database import rollups
+from app.database.connection import AsyncSessionLocal, get_db, get_redis
 from app.models import Equipment, Sensor, SensorData, Alert
 from pydantic import BaseModel
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Generational cache invalidation: bump_monitoring_rev() INCRs this key
+# and all cached monitoring payloads go stale at once, without any key
+# enumeration. Called from the discrete write paths (alert acknowledge,
+# equipment CRUD/connect) — not from the streaming ingest flush, whose
+# sub-second cadence would defeat the caches entirely; TTLs already
+# bound staleness against the telemetry stream.
+_REV_KEY = "monitoring:rev"
+
+async def bump_monitoring_rev():
+    """Invalidate all cached monitoring payloads (best effort)"""
+    try:
+        await get_redis().incr(_REV_KEY)
+    except Exception:
+        pass  # Redis unavailable — caches fall back to TTL expiry
+
+async def _cache_get(key: str):
+    """Fetch a cached payload under the current invalidation revision"""
+    redis = get_redis()
+    try:
+        rev = await redis.get(_REV_KEY) or "0"
+        cached = await redis.get(f"{key}:{rev}")
+        if cached:
+            return orjson.loads(cached)
+    except Exception:
+        pass  # Redis unavailable — compute from SQL
+    return None
+
+async def _cache_set(key: str, payload, ttl: int):
+    """Store a payload under the current invalidation revision"""
+    redis = get_redis()
+    try:
+        rev = await redis.get(_REV_KEY) or "0"
+        await redis.setex(f"{key}:{rev}", ttl, orjson.dumps(payload))
+    except Exception:
+        pass
 
 class DashboardOverview(BaseModel):
     total_equipment: int
@@ -20,97 +64,133 @@ class DashboardOverview(BaseModel):
     protocols_summary: Dict[str, int]
 
 @router.get("/dashboard", response_model=DashboardOverview)
-async def get_dashboard_overview(db: Session = Depends(get_db)):
+async def get_dashboard_overview(db: AsyncSession = Depends(get_db)):
     """Get comprehensive dashboard overview for monitoring interface"""
-    
-    # Equipment statistics
-    total_equipment = db.query(func.count(Equipment.id)).scalar()
-    active_equipment = db.query(func.count(Equipment.id)).filter(Equipment.is_active == True).scalar()
-    connected_equipment = db.query(func.count(Equipment.id)).filter(Equipment.is_connected == True).scalar()
-    
-    # Alert statistics
-    total_alerts = db.query(func.count(Alert.id)).filter(Alert.is_acknowledged == False).scalar()
-    critical_alerts = db.query(func.count(Alert.id)).filter(
-        Alert.severity == "CRITICAL",
-        Alert.is_acknowledged == False
-    ).scalar()
-    
-    # Data points today
+
+    cached = await _cache_get("monitoring:dashboard")
+    if cached:
+        return DashboardOverview(**cached)
+
     today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    data_points_today = db.query(func.count(SensorData.id)).filter(
-        SensorData.timestamp >= today
-    ).scalar()
-    
-    # Protocol distribution
-    protocol_stats = db.query(
-        Equipment.protocol,
-        func.count(Equipment.id)
-    ).filter(Equipment.is_active == True).group_by(Equipment.protocol).all()
-    
-    protocols_summary = {stat[0]: stat[1] for stat in protocol_stats}
-    
-    return DashboardOverview(
-        total_equipment=total_equipment or 0,
-        active_equipment=active_equipment or 0,
-        connected_equipment=connected_equipment or 0,
-        total_alerts=total_alerts or 0,
-        critical_alerts=critical_alerts or 0,
-        data_points_today=data_points_today or 0,
+
+    # Per-table FILTER aggregates: equipment and alert counters each share a
+    # single scan, collapsing seven sequential scalar queries into one
+    # round-trip of scalar subqueries
+    equipment_counts = select(
+        func.count(Equipment.id).label('total'),
+        func.count(Equipment.id).filter(Equipment.is_active == True).label('active'),
+        func.count(Equipment.id).filter(Equipment.is_connected == True).label('connected')
+    ).subquery()
+
+    alert_counts = select(
+        func.count(Alert.id).filter(Alert.is_acknowledged == False).label('total'),
+        func.count(Alert.id).filter(
+            Alert.severity == "CRITICAL",
+            Alert.is_acknowledged == False
+        ).label('critical')
+    ).subquery()
+
+    protocol_counts = select(
+        Equipment.protocol.label('protocol'),
+        func.count(Equipment.id).label('count')
+    ).where(Equipment.is_active == True).group_by(Equipment.protocol).subquery()
+
+    stmt = select(
+        equipment_counts.c.total.label('total_equipment'),
+        equipment_counts.c.active.label('active_equipment'),
+        equipment_counts.c.connected.label('connected_equipment'),
+        alert_counts.c.total.label('total_alerts'),
+        alert_counts.c.critical.label('critical_alerts'),
+        select(func.count(SensorData.id)).where(
+            SensorData.timestamp >= today
+        ).scalar_subquery().label('data_points_today'),
+        select(func.coalesce(
+            func.json_object_agg(protocol_counts.c.protocol, protocol_counts.c.count),
+            text("'{}'::json")
+        )).scalar_subquery().label('protocols_summary')
+    )
+
+    row = (await db.execute(stmt)).one()
+
+    protocols_summary = row.protocols_summary or {}
+    if isinstance(protocols_summary, str):
+        protocols_summary = orjson.loads(protocols_summary)
+
+    overview = DashboardOverview(
+        total_equipment=row.total_equipment or 0,
+        active_equipment=row.active_equipment or 0,
+        connected_equipment=row.connected_equipment or 0,
+        total_alerts=row.total_alerts or 0,
+        critical_alerts=row.critical_alerts or 0,
+        data_points_today=row.data_points_today or 0,
         protocols_summary=protocols_summary
     )
 
+    await _cache_set("monitoring:dashboard", overview.model_dump(), 30)
+
+    return overview
+
 @router.get("/realtime-data")
 async def get_realtime_data(
     equipment_ids: Optional[List[str]] = Query(None),
     limit: int = Query(100, le=500),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get latest sensor readings for real-time monitoring"""
-    
-    # Get latest data points for each sensor
-    subquery = db.query(
-        SensorData.sensor_id,
-        func.max(SensorData.timestamp).label('max_timestamp')
-    ).group_by(SensorData.sensor_id).subquery()
-    
-    query = db.query(SensorData).join(Equipment).join(Sensor).join(
-        subquery,
-        (SensorData.sensor_id == subquery.c.sensor_id) & 
-        (SensorData.timestamp == subquery.c.max_timestamp)
-    )
-    
+
+    # Latest row per sensor via DISTINCT ON — one index scan over
+    # (sensor_id, timestamp DESC) instead of a GROUP BY self-join. Only the
+    # serialized columns are fetched; no ORM instances are hydrated
+    stmt = select(
+        Equipment.equipment_id,
+        Equipment.name.label('equipment_name'),
+        Sensor.sensor_id,
+        Sensor.type,
+        Sensor.unit,
+        Sensor.warning_threshold,
+        Sensor.critical_threshold,
+        SensorData.value,
+        SensorData.timestamp,
+        SensorData.quality
+    ).select_from(SensorData).join(Equipment).join(
+        # Explicit ON — the FK chain would join Sensor via Equipment and
+        # DISTINCT ON would pick an arbitrary sibling's type/thresholds
+        Sensor, SensorData.sensor_id == Sensor.id
+    ).distinct(
+        SensorData.sensor_id
+    ).order_by(SensorData.sensor_id, SensorData.timestamp.desc())
+
     if equipment_ids:
-        query = query.filter(Equipment.equipment_id.in_(equipment_ids))
-    
-    latest_readings = query.limit(limit).all()
-    
+        stmt = stmt.where(Equipment.equipment_id.in_(equipment_ids))
+
+    latest_readings = (await db.execute(stmt.limit(limit))).all()
+
     realtime_data = []
     for reading in latest_readings:
         # Determine status based on thresholds
-        sensor = reading.sensor
         status = "NORMAL"
-        
-        if sensor.critical_threshold and reading.value > sensor.critical_threshold:
+
+        if reading.critical_threshold and reading.value > reading.critical_threshold:
             status = "CRITICAL"
-        elif sensor.warning_threshold and reading.value > sensor.warning_threshold:
+        elif reading.warning_threshold and reading.value > reading.warning_threshold:
             status = "WARNING"
-        
+
         realtime_data.append({
-            "equipment_id": reading.equipment.equipment_id,
-            "equipment_name": reading.equipment.name,
-            "sensor_id": reading.sensor.sensor_id,
-            "sensor_type": sensor.type,
+            "equipment_id": reading.equipment_id,
+            "equipment_name": reading.equipment_name,
+            "sensor_id": reading.sensor_id,
+            "sensor_type": reading.type,
             "value": reading.value,
-            "unit": sensor.unit,
+            "unit": reading.unit,
             "timestamp": reading.timestamp,
             "quality": reading.quality,
             "status": status,
             "thresholds": {
-                "warning": sensor.warning_threshold,
-                "critical": sensor.critical_threshold
+                "warning": reading.warning_threshold,
+                "critical": reading.critical_threshold
             }
         })
-    
+
     return {
         "timestamp": datetime.utcnow(),
         "count": len(realtime_data),
@@ -121,22 +201,53 @@ async def get_realtime_data(
 async def get_active_alerts(
     severity: Optional[str] = Query(None),
     equipment_id: Optional[str] = Query(None),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[datetime] = Query(None, description="Return alerts triggered before this timestamp"),
     limit: int = Query(50, le=200),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get active alerts for monitoring"""
-    
-    query = db.query(Alert).filter(Alert.is_acknowledged == False)
-    
+
+    conditions = [Alert.is_acknowledged == False]
+
     if severity:
-        query = query.filter(Alert.severity == severity)
-    
+        conditions.append(Alert.severity == severity)
+
     if equipment_id:
-        query = query.join(Equipment).filter(Equipment.equipment_id == equipment_id)
-    
-    alerts = query.order_by(desc(Alert.triggered_at)).offset(skip).limit(limit).all()
-    
+        conditions.append(Equipment.equipment_id == equipment_id)
+
+    # The filtered total is a scalar subquery over the filters only — a
+    # window count would sit below the keyset predicate and shrink on
+    # every page; projecting the serialized columns skips ORM hydration
+    total_stmt = select(func.count(Alert.id)).where(*conditions)
+    if equipment_id:
+        total_stmt = total_stmt.select_from(Alert).join(Equipment)
+
+    stmt = select(
+        Alert.alert_id,
+        Alert.equipment_id,
+        Alert.severity,
+        Alert.title,
+        Alert.message,
+        Alert.triggered_at,
+        # Age computed alongside the scan — no per-row datetime math in Python
+        cast(func.extract("epoch", func.now() - Alert.triggered_at) / 60, Integer).label('age_minutes'),
+        total_stmt.scalar_subquery().label('total')
+    ).where(*conditions)
+
+    if equipment_id:
+        stmt = stmt.join(Equipment)
+
+    # Keyset pagination: constant cost per page regardless of depth, unlike
+    # OFFSET which scans and discards all preceding rows
+    if cursor:
+        stmt = stmt.where(Alert.triggered_at < cursor)
+
+    alerts = (await db.execute(
+        stmt.order_by(desc(Alert.triggered_at)).limit(limit)
+    )).all()
+
+    total_count = alerts[0].total if alerts else 0
+
     return {
         "alerts": [
             {
@@ -146,90 +257,122 @@ async def get_active_alerts(
                 "title": alert.title,
                 "message": alert.message,
                 "triggered_at": alert.triggered_at,
-                "age_minutes": int((datetime.utcnow() - alert.triggered_at).total_seconds() / 60)
+                "age_minutes": alert.age_minutes
             }
             for alert in alerts
         ],
-        "total_count": len(alerts)
+        "total_count": total_count,
+        "next_cursor": alerts[-1].triggered_at if len(alerts) == limit else None
     }
 
 @router.post("/alerts/{alert_id}/acknowledge")
 async def acknowledge_alert(
-    alert_id: str,
+    alert_id: UUID,
     acknowledged_by: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Acknowledge an alert"""
-    
-    alert = db.query(Alert).filter(Alert.alert_id == alert_id).first()
-    if not alert:
-        raise HTTPException(status_code=404, detail="Alert not found")
-    
-    alert.is_acknowledged = True
-    alert.acknowledged_by = acknowledged_by
-    alert.acknowledged_at = datetime.utcnow()
-    
-    db.commit()
-    
+
+    # Single UPDATE ... RETURNING: one round-trip instead of SELECT+UPDATE,
+    # no ORM hydration, and atomic — two concurrent clients cannot both
+    # claim the acknowledgement
+    acknowledged = await db.scalar(
+        update(Alert).where(
+            Alert.alert_id == alert_id,
+            Alert.is_acknowledged == False
+        ).values(
+            is_acknowledged=True,
+            acknowledged_by=acknowledged_by,
+            acknowledged_at=func.now()
+        ).returning(Alert.alert_id)
+    )
+
+    if acknowledged is None:
+        # Zero rows updated: the alert is either missing or already
+        # acknowledged — only the former is an error; re-acknowledging
+        # is an idempotent success, it just doesn't claim the credit
+        exists = await db.scalar(select(Alert.alert_id).where(Alert.alert_id == alert_id))
+        if exists is None:
+            raise HTTPException(status_code=404, detail="Alert not found")
+        return {"message": f"Alert {alert_id} was already acknowledged"}
+
+    await db.commit()
+    await bump_monitoring_rev()
+
     return {"message": f"Alert {alert_id} acknowledged by {acknowledged_by}"}
 
 @router.get("/equipment-health")
 async def get_equipment_health(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get health status of all equipment"""
-    
-    equipment_list = db.query(Equipment).filter(Equipment.is_active == True).all()
-    
+
+    cached = await _cache_get("monitoring:equipment-health")
+    if cached:
+        return cached
+
+    now = datetime.utcnow()
+
+    # Health classification as a SQL CASE — one vectorized pass in the DB
+    # instead of per-row datetime arithmetic in Python (NULL heartbeats
+    # fall through to DEGRADED, matching the old behaviour)
+    equipment_list = (await db.execute(select(
+        Equipment.id,
+        Equipment.equipment_id,
+        Equipment.name,
+        Equipment.type,
+        Equipment.protocol,
+        Equipment.is_connected,
+        Equipment.last_heartbeat,
+        case(
+            (Equipment.is_connected == False, "OFFLINE"),
+            (func.now() - Equipment.last_heartbeat < text("interval '5 minutes'"), "HEALTHY"),
+            else_="DEGRADED"
+        ).label('health_status')
+    ).where(Equipment.is_active == True))).all()
+
+    # One grouped pass over the last hour replaces a per-equipment query;
+    # good/total counts aggregate server-side instead of in Python
+    quality_rows = (await db.execute(select(
+        SensorData.equipment_id,
+        func.count(SensorData.id).label('total'),
+        func.count(SensorData.id).filter(SensorData.quality == "GOOD").label('good')
+    ).where(
+        SensorData.timestamp >= now - timedelta(hours=1)
+    ).group_by(SensorData.equipment_id))).all()
+
+    quality_by_equipment = {row.equipment_id: (row.total, row.good) for row in quality_rows}
+
     health_data = []
     for equipment in equipment_list:
-        # Get latest heartbeat
-        time_since_heartbeat = None
-        if equipment.last_heartbeat:
-            time_since_heartbeat = (datetime.utcnow() - equipment.last_heartbeat).total_seconds()
-        
-        # Determine health status
-        health_status = "UNKNOWN"
-        if equipment.is_connected:
-            if time_since_heartbeat and time_since_heartbeat < 300:  # 5 minutes
-                health_status = "HEALTHY"
-            else:
-                health_status = "DEGRADED"
-        else:
-            health_status = "OFFLINE"
-        
-        # Get recent data quality
-        recent_data = db.query(SensorData).filter(
-            SensorData.equipment_id == equipment.id,
-            SensorData.timestamp >= datetime.utcnow() - timedelta(hours=1)
-        ).all()
-        
+        # Recent data quality from the grouped counts
+        total_points, good_quality = quality_by_equipment.get(equipment.id, (0, 0))
+
         data_quality = "UNKNOWN"
-        if recent_data:
-            good_quality = sum(1 for d in recent_data if d.quality == "GOOD")
-            quality_ratio = good_quality / len(recent_data)
-            
+        if total_points:
+            quality_ratio = good_quality / total_points
+
             if quality_ratio >= 0.9:
                 data_quality = "EXCELLENT"
             elif quality_ratio >= 0.7:
                 data_quality = "GOOD"
             else:
                 data_quality = "POOR"
-        
+
         health_data.append({
             "equipment_id": equipment.equipment_id,
             "name": equipment.name,
             "type": equipment.type,
             "protocol": equipment.protocol,
-            "health_status": health_status,
+            "health_status": equipment.health_status,
             "is_connected": equipment.is_connected,
             "last_heartbeat": equipment.last_heartbeat,
             "data_quality": data_quality,
-            "recent_data_points": len(recent_data)
+            "recent_data_points": total_points
         })
-    
-    return {
-        "timestamp": datetime.utcnow(),
+
+    payload = {
+        "timestamp": now,
         "equipment": health_data,
         "summary": {
             "total": len(health_data),
@@ -239,49 +382,88 @@ async def get_equipment_health(
         }
     }
 
+    await _cache_set("monitoring:equipment-health", payload, 15)
+
+    return payload
+
 @router.get("/performance-metrics")
 async def get_performance_metrics(
     hours: int = Query(24, ge=1, le=168),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get system performance metrics"""
-    
+
+    cached = await _cache_get(f"monitoring:performance-metrics:{hours}")
+    if cached:
+        return cached
+
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(hours=hours)
-    
-    # Data ingestion rate
-    data_points = db.query(func.count(SensorData.id)).filter(
-        SensorData.timestamp >= start_time
-    ).scalar()
-    
+
+    # Read pre-aggregated 1-minute buckets: O(minutes) rows instead of
+    # re-scanning every raw data point in the window
+    try:
+        bucket_rows = (await db.execute(text(
+            f"SELECT source_protocol, quality, sum(count_value) AS count_value "
+            f"FROM {rollups.PERF_VIEW_NAME} "
+            f"WHERE time_bucket >= :start_time "
+            f"GROUP BY source_protocol, quality"
+        ), {"start_time": start_time})).all()
+
+        data_points = sum(int(row.count_value) for row in bucket_rows)
+
+        protocol_breakdown = {}
+        quality_breakdown = {}
+        for row in bucket_rows:
+            count = int(row.count_value)
+            protocol_breakdown[row.source_protocol] = (
+                protocol_breakdown.get(row.source_protocol, 0) + count
+            )
+            quality_breakdown[row.quality] = (
+                quality_breakdown.get(row.quality, 0) + count
+            )
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"Performance rollup unavailable, scanning raw rows: {e}")
+
+        # The three raw scans are independent, so run them concurrently on
+        # separate sessions (a session serves one statement at a time) —
+        # latency becomes max(scan_i) instead of sum(scan_i)
+        async def _scalar(stmt):
+            async with AsyncSessionLocal() as session:
+                return await session.scalar(stmt)
+
+        async def _rows(stmt):
+            async with AsyncSessionLocal() as session:
+                return (await session.execute(stmt)).all()
+
+        data_points, protocol_data, quality_data = await asyncio.gather(
+            _scalar(
+                select(func.count(SensorData.id)).where(SensorData.timestamp >= start_time)
+            ),
+            _rows(
+                select(SensorData.source_protocol, func.count(SensorData.id)).where(
+                    SensorData.timestamp >= start_time
+                ).group_by(SensorData.source_protocol)
+            ),
+            _rows(
+                select(SensorData.quality, func.count(SensorData.id)).where(
+                    SensorData.timestamp >= start_time
+                ).group_by(SensorData.quality)
+            ),
+        )
+
+        protocol_breakdown = {proto[0]: proto[1] for proto in protocol_data}
+        quality_breakdown = {qual[0]: qual[1] for qual in quality_data}
+
     ingestion_rate = (data_points or 0) / hours  # points per hour
-    
-    # Protocol distribution of recent data
-    protocol_data = db.query(
-        SensorData.source_protocol,
-        func.count(SensorData.id)
-    ).filter(
-        SensorData.timestamp >= start_time
-    ).group_by(SensorData.source_protocol).all()
-    
-    protocol_breakdown = {proto[0]: proto[1] for proto in protocol_data}
-    
-    # Quality metrics
-    quality_data = db.query(
-        SensorData.quality,
-        func.count(SensorData.id)
-    ).filter(
-        SensorData.timestamp >= start_time
-    ).group_by(SensorData.quality).all()
-    
-    quality_breakdown = {qual[0]: qual[1] for qual in quality_data}
-    
+
     # Connection stability
-    connection_events = db.query(Equipment).filter(
-        Equipment.last_heartbeat >= start_time
-    ).count()
-    
-    return {
+    connection_events = await db.scalar(
+        select(func.count(Equipment.id)).where(Equipment.last_heartbeat >= start_time)
+    )
+
+    payload = {
         "time_period": {
             "start": start_time,
             "end": end_time,
@@ -295,7 +477,11 @@ async def get_performance_metrics(
         "protocol_breakdown": protocol_breakdown,
         "quality_metrics": quality_breakdown,
         "connection_stability": {
-            "active_connections": connection_events,
-            "connection_rate": round(connection_events / hours, 2)
+            "active_connections": connection_events or 0,
+            "connection_rate": round((connection_events or 0) / hours, 2)
         }
-    }
\ No newline at end of file
+    }
+
+    await _cache_set(f"monitoring:performance-metrics:{hours}", payload, 300)
+
+    return payload
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
@@ -7,7 +9,7 @@ from app.database.connection import get_db
 from app.models import Equipment, Sensor, SensorData
 from pydantic import BaseModel
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 class SensorCreate(BaseModel):
     sensor_id: str
@@ -39,25 +41,25 @@ class SensorResponse(BaseModel):
     class Config:
         from_attributes = True
 
-@router.post("/", response_model=SensorResponse)
+@router.post("/", response_model=None)
 async def create_sensor(
     sensor: SensorCreate,
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_db)
+) -> SensorResponse:
     """Create new sensor configuration"""
     # Find equipment
-    equipment = db.query(Equipment).filter(
+    equipment = await db.scalar(select(Equipment).where(
         Equipment.equipment_id == sensor.equipment_id
-    ).first()
-    
+    ))
+
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     
     # Check if sensor already exists
-    existing = db.query(Sensor).filter(
+    existing = await db.scalar(select(Sensor).where(
         Sensor.sensor_id == sensor.sensor_id
-    ).first()
-    
+    ))
+
     if existing:
         raise HTTPException(status_code=400, detail="Sensor ID already exists")
     
@@ -76,40 +78,48 @@ async def create_sensor(
     )
     
     db.add(db_sensor)
-    db.commit()
-    db.refresh(db_sensor)
-    
-    return db_sensor
+    await db.commit()
+    await db.refresh(db_sensor)
+
+    # Validate once here instead of a second FastAPI response_model pass
+    return SensorResponse.model_validate(db_sensor)
 
-@router.get("/", response_model=List[SensorResponse])
+@router.get("/", response_model=None)
 async def list_sensors(
     equipment_id: Optional[str] = Query(None),
     sensor_type: Optional[str] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, le=500),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List sensors with filtering"""
-    query = db.query(Sensor).join(Equipment)
-    
+    stmt = select(Sensor).join(Equipment)
+
     if equipment_id:
-        query = query.filter(Equipment.equipment_id == equipment_id)
-    
+        stmt = stmt.where(Equipment.equipment_id == equipment_id)
+
     if sensor_type:
-        query = query.filter(Sensor.type == sensor_type)
-    
-    sensors = query.offset(skip).limit(limit).all()
+        stmt = stmt.where(Sensor.type == sensor_type)
+
+    # Stream from a server-side cursor so large pages are validated in
+    # fixed-size chunks instead of one buffered result set
+    result = await db.stream(
+        stmt.offset(skip).limit(limit).execution_options(yield_per=500)
+    )
+    sensors = []
+    async for sensor in result.scalars():
+        sensors.append(SensorResponse.model_validate(sensor))
     return sensors
 
-@router.get("/{sensor_id}", response_model=SensorResponse)
+@router.get("/{sensor_id}", response_model=None)
 async def get_sensor(
     sensor_id: str,
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_db)
+) -> SensorResponse:
     """Get specific sensor details"""
-    sensor = db.query(Sensor).filter(Sensor.sensor_id == sensor_id).first()
-    
+    sensor = await db.scalar(select(Sensor).where(Sensor.sensor_id == sensor_id))
+
     if not sensor:
         raise HTTPException(status_code=404, detail="Sensor not found")
-    
-    return sensor
\ No newline at end of file
+
+    return SensorResponse.model_validate(sensor)
\ No newline at end of file
@@ -1,42 +1,84 @@
+import asyncio
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+import redis.asyncio as aioredis
 from app.core.config import settings
 from app.models import Base
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Create database engine
+def _async_database_url(url: str) -> str:
+    """Rewrite the configured URL to use the asyncpg driver"""
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# Synchronous engine — used by ingestion services and background workers
 engine = create_engine(
     settings.DATABASE_URL,
     pool_size=settings.DATABASE_POOL_SIZE,
     max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    # Revalidate pooled connections cheaply and rotate them hourly so
+    # firewalled/idle-killed connections never surface as request errors
+    pool_pre_ping=True,
+    pool_recycle=3600,
     echo=settings.DEBUG
 )
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine — used by API endpoints so DB calls never block the event loop
+async_engine = create_async_engine(
+    _async_database_url(settings.DATABASE_URL),
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    echo=settings.DEBUG
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Shared Redis client for caching (connects lazily on first use)
+redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+
+def get_redis() -> aioredis.Redis:
+    """Get shared Redis client — callers handle connection errors"""
+    return redis_client
+
 async def init_db():
     """Initialize database tables"""
     try:
-        Base.metadata.create_all(bind=engine)
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables initialized successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
         raise
 
-def get_db() -> Session:
-    """Get database session"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    # In-place column migrations for databases created before model
+    # changes — create_all never alters existing columns
+    from app.database.migrations import run_startup_migrations
+    await asyncio.to_thread(run_startup_migrations, engine)
 
-async def get_async_db():
+    # Rollup views are optional (e.g. unavailable on non-PostgreSQL backends);
+    # their DDL runs on the sync engine in a worker thread
+    from app.database.rollups import create_rollup_views
+    await asyncio.to_thread(create_rollup_views, engine)
+
+    if settings.TIMESCALEDB_ENABLED:
+        from app.database.timescale import setup_timescaledb
+        await asyncio.to_thread(setup_timescaledb, engine)
+
+async def get_db() -> AsyncSession:
     """Get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_sync_db() -> Session:
+    """Get synchronous database session (background workers only)"""
     db = SessionLocal()
     try:
         yield db
@@ -0,0 +1,43 @@
+"""In-place schema migrations applied at startup.
+
+create_all only creates missing tables — it never alters existing columns —
+so model changes that retype a column need an explicit, idempotent DDL step
+for databases created before the change. Each block checks the current
+column type and converts only when needed, making repeat runs no-ops.
+"""
+
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# alert_id/job_id were String(50) before moving to native UUID columns;
+# UUID-typed binds fail against the old varchar columns, so convert them
+_UUID_COLUMN_DDL = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = '{table}' AND column_name = '{column}'
+          AND data_type = 'character varying'
+    ) THEN
+        ALTER TABLE {table} ALTER COLUMN {column} TYPE uuid USING {column}::uuid;
+    END IF;
+END $$
+"""
+
+_UUID_COLUMNS = (
+    ("alerts", "alert_id"),
+    ("data_processing_jobs", "job_id"),
+)
+
+
+def run_startup_migrations(engine):
+    """Apply the in-place migrations (idempotent, PostgreSQL only)"""
+    for table, column in _UUID_COLUMNS:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(_UUID_COLUMN_DDL.format(table=table, column=column)))
+        except Exception as e:
+            logger.warning(f"Could not migrate {table}.{column} to uuid: {e}")
@@ -0,0 +1,123 @@
+"""Materialized rollup views for pre-aggregated sensor data queries.
+
+Each view stores per-(equipment_id, sensor_type, time_bucket) aggregates so
+dashboard queries read G bucket rows instead of re-scanning N raw rows on
+every request. Views are created at startup and refreshed either by the
+in-process refresh loop below or externally (e.g. pg_cron calling
+REFRESH MATERIALIZED VIEW CONCURRENTLY).
+"""
+
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# interval -> (view name, bucket SQL expression over sensor_data.timestamp)
+ROLLUP_VIEWS = {
+    "1m": ("sensor_data_agg_1m", "date_trunc('minute', sd.timestamp)"),
+    "5m": (
+        "sensor_data_agg_5m",
+        "date_trunc('hour', sd.timestamp) + "
+        "floor(extract(minute from sd.timestamp) / 5) * interval '5 minutes'"
+    ),
+    "1h": ("sensor_data_agg_1h", "date_trunc('hour', sd.timestamp)"),
+    "1d": ("sensor_data_agg_1d", "date_trunc('day', sd.timestamp)"),
+}
+
+# View names whose refresh is owned elsewhere (e.g. TimescaleDB policy jobs)
+EXTERNALLY_REFRESHED = set()
+
+# 1-minute ingest/protocol/quality buckets backing /monitoring/performance-metrics;
+# TimescaleDB setup repoints this at a continuous aggregate when enabled
+PERF_VIEW_NAME = "sensor_data_perf_1m"
+
+_PERF_VIEW_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_data_perf_1m AS
+SELECT
+    date_trunc('minute', timestamp) AS time_bucket,
+    coalesce(source_protocol, 'UNKNOWN') AS source_protocol,
+    coalesce(quality, 'UNKNOWN') AS quality,
+    count(*) AS count_value
+FROM sensor_data
+GROUP BY 1, 2, 3
+"""
+
+_PERF_INDEX_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS ux_sensor_data_perf_1m
+ON sensor_data_perf_1m (time_bucket, source_protocol, quality)
+"""
+
+# Column to read for each aggregation mode supported by /data/query
+ROLLUP_AGG_COLUMNS = {
+    "avg": "avg_value",
+    "min": "min_value",
+    "max": "max_value",
+    "count": "count_value",
+}
+
+_VIEW_TEMPLATE = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS
+SELECT
+    e.equipment_id AS equipment_id,
+    s.type AS sensor_type,
+    {bucket} AS time_bucket,
+    avg(sd.value) AS avg_value,
+    min(sd.value) AS min_value,
+    max(sd.value) AS max_value,
+    count(sd.value) AS count_value,
+    sum(sd.value * sd.value) AS sum_sq
+FROM sensor_data sd
+JOIN equipment e ON e.id = sd.equipment_id
+JOIN sensors s ON s.id = sd.sensor_id
+GROUP BY 1, 2, 3
+"""
+
+_INDEX_TEMPLATE = """
+CREATE UNIQUE INDEX IF NOT EXISTS ux_{name}
+ON {name} (equipment_id, sensor_type, time_bucket)
+"""
+
+
+def create_rollup_views(engine):
+    """Create the rollup views and their unique indexes (idempotent)"""
+    for name, bucket in ROLLUP_VIEWS.values():
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(_VIEW_TEMPLATE.format(name=name, bucket=bucket)))
+                conn.execute(text(_INDEX_TEMPLATE.format(name=name)))
+            logger.info(f"Rollup view ready: {name}")
+        except Exception as e:
+            logger.warning(f"Could not create rollup view {name}: {e}")
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(_PERF_VIEW_SQL))
+            conn.execute(text(_PERF_INDEX_SQL))
+        logger.info("Performance rollup view ready: sensor_data_perf_1m")
+    except Exception as e:
+        logger.warning(f"Could not create performance rollup view: {e}")
+
+
+def refresh_rollup_views(engine):
+    """Refresh all rollup views (CONCURRENTLY so readers are not blocked)"""
+    names = [name for name, _ in ROLLUP_VIEWS.values()] + [PERF_VIEW_NAME]
+    for name in names:
+        if name in EXTERNALLY_REFRESHED:
+            continue
+        try:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+        except Exception as e:
+            logger.warning(f"Could not refresh rollup view {name}: {e}")
+
+
+async def rollup_refresh_loop(engine, interval_seconds: int = 60):
+    """Periodically refresh rollup views without blocking the event loop"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(refresh_rollup_views, engine)
+        except Exception as e:
+            logger.error(f"Rollup refresh loop error: {e}")
@@ -0,0 +1,151 @@
+"""Optional TimescaleDB support for the sensor_data time series.
+
+When settings.TIMESCALEDB_ENABLED is set, sensor_data is converted into a
+hypertable (1-day chunks, so time-range queries only touch recent chunks)
+and the 1h/1d rollups are served from continuous aggregates instead of the
+plain materialized views. Continuous aggregates are refreshed incrementally
+by TimescaleDB's own policy jobs, so the in-process refresh loop skips them.
+Requires TimescaleDB >= 2.10 (joins inside continuous aggregates).
+"""
+
+import logging
+
+from sqlalchemy import text
+
+from app.database import rollups
+
+logger = logging.getLogger(__name__)
+
+# TimescaleDB rejects hypertable conversion while any unique index omits
+# the partitioning column, and create_all gives sensor_data a standalone
+# integer PK — widen it to (id, timestamp) first (no-op once done)
+_PK_COMPAT_DDL = """
+DO $$
+DECLARE
+    pk_cols text[];
+BEGIN
+    SELECT array_agg(a.attname) INTO pk_cols
+    FROM pg_index i
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY (i.indkey)
+    WHERE i.indrelid = 'sensor_data'::regclass AND i.indisprimary;
+
+    IF pk_cols IS NULL OR NOT ('timestamp' = ANY (pk_cols)) THEN
+        ALTER TABLE sensor_data DROP CONSTRAINT sensor_data_pkey;
+        ALTER TABLE sensor_data ADD PRIMARY KEY (id, "timestamp");
+    END IF;
+END $$
+"""
+
+_HYPERTABLE_DDL = """
+SELECT create_hypertable(
+    'sensor_data', 'timestamp',
+    chunk_time_interval => INTERVAL '1 day',
+    if_not_exists => TRUE,
+    migrate_data => TRUE
+)
+"""
+
+# interval key -> (view name, time_bucket width, refresh policy offsets)
+_CAGGS = {
+    "1h": ("sensor_data_cagg_1h", "1 hour", ("2 days", "1 hour")),
+    "1d": ("sensor_data_cagg_1d", "1 day", ("7 days", "1 day")),
+}
+
+_CAGG_TEMPLATE = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS {name}
+WITH (timescaledb.continuous) AS
+SELECT
+    e.equipment_id AS equipment_id,
+    s.type AS sensor_type,
+    time_bucket(INTERVAL '{width}', sd.timestamp) AS time_bucket,
+    avg(sd.value) AS avg_value,
+    min(sd.value) AS min_value,
+    max(sd.value) AS max_value,
+    count(sd.value) AS count_value,
+    sum(sd.value * sd.value) AS sum_sq
+FROM sensor_data sd
+JOIN equipment e ON e.id = sd.equipment_id
+JOIN sensors s ON s.id = sd.sensor_id
+GROUP BY 1, 2, 3
+WITH NO DATA
+"""
+
+_POLICY_TEMPLATE = """
+SELECT add_continuous_aggregate_policy(
+    '{name}',
+    start_offset => INTERVAL '{start_offset}',
+    end_offset => INTERVAL '{end_offset}',
+    schedule_interval => INTERVAL '5 minutes',
+    if_not_exists => TRUE
+)
+"""
+
+_PERF_CAGG = "sensor_data_perf_cagg_1m"
+
+_PERF_CAGG_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS sensor_data_perf_cagg_1m
+WITH (timescaledb.continuous) AS
+SELECT
+    time_bucket(INTERVAL '1 minute', timestamp) AS time_bucket,
+    coalesce(source_protocol, 'UNKNOWN') AS source_protocol,
+    coalesce(quality, 'UNKNOWN') AS quality,
+    count(*) AS count_value
+FROM sensor_data
+GROUP BY 1, 2, 3
+WITH NO DATA
+"""
+
+
+def setup_timescaledb(engine):
+    """Create the hypertable and continuous aggregates (idempotent).
+
+    Falls back to the plain rollup views only when the TimescaleDB
+    extension itself is unavailable; with the extension present, a failed
+    hypertable conversion raises — the operator explicitly asked for
+    Timescale, so a broken conversion must not pass as a silent downgrade.
+    """
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb"))
+    except Exception as e:
+        logger.warning(f"TimescaleDB unavailable, keeping plain rollup views: {e}")
+        return
+
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(_PK_COMPAT_DDL))
+            conn.execute(text(_HYPERTABLE_DDL))
+        logger.info("sensor_data hypertable ready")
+    except Exception:
+        logger.error("sensor_data hypertable conversion failed with TIMESCALEDB_ENABLED set")
+        raise
+
+    for interval, (name, width, (start_offset, end_offset)) in _CAGGS.items():
+        try:
+            # Continuous aggregate DDL cannot run inside a transaction block
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(_CAGG_TEMPLATE.format(name=name, width=width)))
+                conn.execute(text(_POLICY_TEMPLATE.format(
+                    name=name, start_offset=start_offset, end_offset=end_offset
+                )))
+
+            # Route /data/query at the continuous aggregate and let the
+            # TimescaleDB policy job own its refresh cycle
+            rollups.ROLLUP_VIEWS[interval] = (name, f"time_bucket(INTERVAL '{width}', sd.timestamp)")
+            rollups.EXTERNALLY_REFRESHED.add(name)
+            logger.info(f"Continuous aggregate ready: {name}")
+        except Exception as e:
+            logger.warning(f"Could not create continuous aggregate {name}: {e}")
+
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(_PERF_CAGG_SQL))
+            conn.execute(text(_POLICY_TEMPLATE.format(
+                name=_PERF_CAGG, start_offset="1 day", end_offset="1 minute"
+            )))
+
+        rollups.PERF_VIEW_NAME = _PERF_CAGG
+        rollups.EXTERNALLY_REFRESHED.add(_PERF_CAGG)
+        logger.info(f"Continuous aggregate ready: {_PERF_CAGG}")
+    except Exception as e:
+        logger.warning(f"Could not create continuous aggregate {_PERF_CAGG}: {e}")
@@ -1,5 +1,5 @@
 from fastapi import Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 import logging
 import traceback
@@ -24,13 +24,13 @@ class ErrorHandlerMiddleware(BaseHTTPMiddleware):
             logger.error(f"Unhandled exception: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
             
-            # Return structured error response
-            return JSONResponse(
+            # Return structured error response (orjson serializes datetimes)
+            return ORJSONResponse(
                 status_code=500,
                 content={
                     "error": "Internal Server Error",
                     "message": "An unexpected error occurred in the Digital Twin platform",
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": datetime.utcnow(),
                     "path": str(request.url.path),
                     "method": request.method
                 }
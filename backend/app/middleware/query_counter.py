@@ -0,0 +1,46 @@
+"""DEBUG-only per-request DB query counting.
+
+Counts every cursor execution during a request and reports it in an
+X-DB-Query-Count response header, making N+1 regressions visible in
+local dev and assertable in tests. Not installed in production, so
+there is no runtime cost there.
+"""
+
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+from starlette.middleware.base import BaseHTTPMiddleware
+
+# Holds a mutable one-element counter rather than the count itself:
+# BaseHTTPMiddleware runs the downstream app in a separate task with a
+# *copy* of the dispatch context, so rebinding an int there would be
+# invisible to dispatch — but the copy shares the holder object, and
+# in-place increments are seen on both sides.
+query_count: ContextVar[Optional[List[int]]] = ContextVar("query_count", default=None)
+
+
+def _on_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    holder = query_count.get()
+    if holder is not None:
+        holder[0] += 1
+
+
+def instrument_engines(*engines):
+    """Attach the query counter to the given (sync) engines"""
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _on_cursor_execute)
+
+
+class QueryCountMiddleware(BaseHTTPMiddleware):
+    """Expose the per-request query count as a response header"""
+
+    async def dispatch(self, request, call_next):
+        holder = [0]
+        token = query_count.set(holder)
+        try:
+            response = await call_next(request)
+            response.headers["X-DB-Query-Count"] = str(holder[0])
+            return response
+        finally:
+            query_count.reset(token)
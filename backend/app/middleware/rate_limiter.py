@@ -1,63 +1,124 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict
+from collections import OrderedDict, deque
+import itertools
 import time
 import asyncio
 from app.core.config import settings
+from app.database.connection import get_redis
 
 class RateLimiterMiddleware(BaseHTTPMiddleware):
     """Rate limiting middleware to protect API endpoints"""
-    
+
+    # Upper bound on distinct IPs the in-process fallback tracks
+    MAX_TRACKED_IPS = 10000
+
     def __init__(self, app):
         super().__init__(app)
-        self.requests = defaultdict(list)
+        # ip -> deque of monotonic timestamps, LRU-ordered for eviction
+        self.requests: OrderedDict = OrderedDict()
         self.window_size = 60  # 1 minute window
         self.max_requests = settings.RATE_LIMIT_PER_MINUTE
-    
+        self._seq = itertools.count()
+        self._fallback_hits = 0
+
     async def dispatch(self, request: Request, call_next):
         client_ip = self._get_client_ip(request)
         current_time = time.time()
-        
-        # Clean old requests
-        self._cleanup_old_requests(client_ip, current_time)
-        
-        # Check rate limit
-        if len(self.requests[client_ip]) >= self.max_requests:
+        # Bind hot attributes once per request
+        max_requests = self.max_requests
+        window_size = self.window_size
+
+        # Redis sliding window first: correct limits across workers and
+        # bounded memory; the in-process window is only a fallback
+        allowed, used = await self._check_redis(client_ip, current_time)
+
+        if allowed is None:
+            # Redis unavailable — fall back to the process-local window
+            allowed, used = self._check_local(client_ip)
+
+        if not allowed:
             return JSONResponse(
                 status_code=429,
                 content={
                     "error": "Rate Limit Exceeded",
-                    "message": f"Maximum {self.max_requests} requests per minute allowed",
+                    "message": f"Maximum {max_requests} requests per minute allowed",
                     "retry_after": 60
                 },
                 headers={"Retry-After": "60"}
             )
-        
-        # Record this request
-        self.requests[client_ip].append(current_time)
-        
+
         response = await call_next(request)
-        
+
         # Add rate limiting headers
-        remaining = max(0, self.max_requests - len(self.requests[client_ip]))
-        response.headers["X-RateLimit-Limit"] = str(self.max_requests)
+        remaining = max(0, max_requests - used)
+        response.headers["X-RateLimit-Limit"] = str(max_requests)
         response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(int(current_time + self.window_size))
-        
+        response.headers["X-RateLimit-Reset"] = str(int(current_time + window_size))
+
         return response
-    
+
+    async def _check_redis(self, client_ip: str, current_time: float):
+        """Sliding-window check against a Redis sorted set.
+
+        One pipelined MULTI/EXEC: drop expired entries, count the window,
+        record this request, refresh the key TTL. Returns (None, 0) when
+        Redis is unreachable so the caller can fall back.
+        """
+        try:
+            redis = get_redis()
+            key = f"rl:{client_ip}"
+            member = f"{current_time:.6f}-{next(self._seq)}"
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.zremrangebyscore(key, 0, current_time - self.window_size)
+                pipe.zcard(key)
+                pipe.zadd(key, {member: current_time})
+                pipe.expire(key, self.window_size)
+                _, window_count, _, _ = await pipe.execute()
+            return window_count < self.max_requests, window_count + 1
+        except Exception:
+            return None, 0
+
     def _get_client_ip(self, request: Request) -> str:
         """Extract client IP from request"""
         forwarded = request.headers.get("X-Forwarded-For")
         if forwarded:
-            return forwarded.split(",")[0].strip()
+            # find/slice instead of split(): no throwaway list on a path
+            # that runs for every request
+            comma = forwarded.find(",")
+            ip = forwarded if comma < 0 else forwarded[:comma]
+            return ip.strip()
         return request.client.host if request.client else "unknown"
-    
-    def _cleanup_old_requests(self, client_ip: str, current_time: float):
-        """Remove requests outside the time window"""
-        cutoff_time = current_time - self.window_size
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if req_time > cutoff_time
-        ]
\ No newline at end of file
+
+    def _check_local(self, client_ip: str):
+        """Process-local sliding window on monotonic time.
+
+        Expired entries are popped from the left of a deque (amortized O(1)
+        versus rebuilding a list per request) and idle IPs are evicted LRU
+        so the table cannot grow unbounded. Monotonic time is immune to
+        wall-clock jumps from NTP adjustments.
+        """
+        now = time.monotonic()
+        cutoff = now - self.window_size
+
+        dq = self.requests.get(client_ip)
+        if dq is None:
+            dq = deque()
+            self.requests[client_ip] = dq
+        while dq and dq[0] <= cutoff:
+            dq.popleft()
+        self.requests.move_to_end(client_ip)
+
+        used = len(dq) + 1
+        allowed = used <= self.max_requests
+        if allowed:
+            dq.append(now)
+
+        # Amortized LRU eviction of idle IPs
+        self._fallback_hits += 1
+        if self._fallback_hits % 1024 == 0:
+            while len(self.requests) > self.MAX_TRACKED_IPS:
+                self.requests.popitem(last=False)
+
+        return allowed, used
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, JSON, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -34,9 +35,10 @@ class Equipment(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    # Relationships
-    sensors = relationship("Sensor", back_populates="equipment")
-    data_points = relationship("SensorData", back_populates="equipment")
+    # Relationships — lazy loads are disabled by default so N+1 regressions
+    # fail loudly; query sites opt in with joinedload/selectinload
+    sensors = relationship("Sensor", back_populates="equipment", lazy="raise_on_sql")
+    data_points = relationship("SensorData", back_populates="equipment", lazy="raise_on_sql")
 
 class Sensor(Base):
     """Sensor configuration model"""
@@ -65,8 +67,8 @@ class Sensor(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
-    equipment = relationship("Equipment", back_populates="sensors")
-    data_points = relationship("SensorData", back_populates="sensor")
+    equipment = relationship("Equipment", back_populates="sensors", lazy="raise_on_sql")
+    data_points = relationship("SensorData", back_populates="sensor", lazy="raise_on_sql")
 
 class SensorData(Base):
     """Real-time sensor data model"""
@@ -91,15 +93,34 @@ class SensorData(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    equipment = relationship("Equipment", back_populates="data_points")
-    sensor = relationship("Sensor", back_populates="data_points")
+    equipment = relationship("Equipment", back_populates="data_points", lazy="raise_on_sql")
+    sensor = relationship("Sensor", back_populates="data_points", lazy="raise_on_sql")
+
+    # Covering index matching the hot filter/group-by pattern: per-equipment,
+    # per-sensor time-range scans that only need value and quality
+    __table_args__ = (
+        Index(
+            "ix_sd_eq_sensor_ts",
+            "equipment_id",
+            "sensor_id",
+            text("timestamp DESC"),
+            postgresql_include=["value", "quality"]
+        ),
+        # Serves the DISTINCT ON (sensor_id) latest-per-sensor scan
+        Index("ix_sd_sensor_ts", "sensor_id", text("timestamp DESC")),
+        # Timestamp-leading index for the monitoring time-window scans
+        # (data_points_today, performance-metrics, recent-health windows).
+        # Very large append-only deployments may prefer a BRIN on timestamp.
+        Index("ix_sd_ts_eq_sensor", "timestamp", "equipment_id", "sensor_id"),
+    )
 
 class Alert(Base):
     """Alert and notification model"""
     __tablename__ = "alerts"
     
     id = Column(Integer, primary_key=True, index=True)
-    alert_id = Column(String(50), unique=True, default=lambda: str(uuid.uuid4()))
+    # Native uuid: 16 bytes vs a 36-char string, smaller index, faster compare
+    alert_id = Column(UUID(as_uuid=True), unique=True, default=uuid.uuid4)
     
     equipment_id = Column(Integer, ForeignKey("equipment.id"), nullable=False)
     sensor_id = Column(Integer, ForeignKey("sensors.id"))
@@ -124,7 +145,7 @@ class DataProcessingJob(Base):
     __tablename__ = "data_processing_jobs"
     
     id = Column(Integer, primary_key=True, index=True)
-    job_id = Column(String(50), unique=True, default=lambda: str(uuid.uuid4()))
+    job_id = Column(UUID(as_uuid=True), unique=True, default=uuid.uuid4)
     
     # Job details
     job_type = Column(String(50), nullable=False)  # "aggregation", "anomaly_detection", "export"
@@ -0,0 +1,71 @@
+"""Standalone ingestion process.
+
+Run with `python -m app.services.ingestion_daemon` (from backend/). Keeps
+the MQTT and OPC UA ingestion loops in their own process so parse or flush
+spikes cannot starve HTTP handlers in the API workers, and so the two can
+be scaled and restarted independently. The API reports ingestion health
+from the status key this process refreshes in Redis.
+
+Assumes the schema already exists (the API's startup or a migration
+created it); no DDL runs here.
+"""
+import asyncio
+import logging
+import signal
+
+import orjson
+
+from app.core.logging import setup_logging
+from app.database.connection import get_redis
+from app.services.protocols.registry import get_mqtt, get_opcua
+
+logger = logging.getLogger("ingestion")
+
+# Redis key the API's /health endpoint reads; refreshed on an interval
+# with a TTL so a dead daemon reads as disconnected
+STATUS_KEY = "ingestion:status"
+STATUS_INTERVAL_SECONDS = 5
+
+async def _publish_status(mqtt_service, opcua_service):
+    """Refresh the shared ingestion-status key for the API health check"""
+    redis = get_redis()
+    while True:
+        try:
+            await redis.setex(
+                STATUS_KEY,
+                STATUS_INTERVAL_SECONDS * 3,
+                orjson.dumps({
+                    "mqtt": mqtt_service.is_connected,
+                    "opc_ua": opcua_service.is_connected
+                })
+            )
+        except Exception as e:
+            logger.warning(f"Could not publish ingestion status: {e}")
+        await asyncio.sleep(STATUS_INTERVAL_SECONDS)
+
+async def main():
+    setup_logging()
+
+    mqtt_service = get_mqtt()
+    opcua_service = get_opcua()
+
+    await mqtt_service.connect()
+    await opcua_service.connect()
+    status_task = asyncio.create_task(_publish_status(mqtt_service, opcua_service))
+
+    logger.info("Ingestion daemon started")
+
+    # Run until SIGINT/SIGTERM, then drain and disconnect cleanly
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Ingestion daemon shutting down")
+    status_task.cancel()
+    await mqtt_service.disconnect()
+    await opcua_service.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
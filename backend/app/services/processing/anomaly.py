@@ -0,0 +1,238 @@
+"""Vectorized anomaly detection over batches of sensor data.
+
+Used as the in-process fallback when per-group statistics cannot be computed
+in SQL (e.g. backends without stddev). Group statistics and the outlier mask
+are computed with pandas/NumPy array operations instead of per-point Python
+loops.
+"""
+
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("data_processing")
+
+_COLUMNS = ["equipment_id", "sensor_type", "value", "timestamp"]
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+if _HAS_NUMBA:
+    @njit(cache=True, nogil=True)
+    def _group_stats(codes, values, n_groups):
+        """Single-pass per-group count/sum/sum-of-squares accumulation"""
+        counts = np.zeros(n_groups, dtype=np.int64)
+        sums = np.zeros(n_groups, dtype=np.float64)
+        sum_sq = np.zeros(n_groups, dtype=np.float64)
+
+        for i in range(values.shape[0]):
+            g = codes[i]
+            counts[g] += 1
+            sums[g] += values[i]
+            sum_sq[g] += values[i] * values[i]
+
+        mean = np.zeros(n_groups, dtype=np.float64)
+        std = np.zeros(n_groups, dtype=np.float64)
+        for g in range(n_groups):
+            if counts[g] > 0:
+                m = sums[g] / counts[g]
+                mean[g] = m
+                variance = sum_sq[g] / counts[g] - m * m
+                if variance > 0:
+                    std[g] = np.sqrt(variance)
+        return counts, mean, std
+
+    @njit(parallel=True, cache=True, nogil=True)
+    def _flag_outliers(codes, values, counts, mean, std, k, min_group_size):
+        """Parallel pass flagging values outside the per-group threshold band"""
+        n = values.shape[0]
+        mask = np.zeros(n, dtype=np.bool_)
+        deviation = np.zeros(n, dtype=np.float64)
+
+        for i in prange(n):
+            g = codes[i]
+            s = std[g]
+            if counts[g] >= min_group_size and s > 0.0:
+                d = abs(values[i] - mean[g]) / s
+                deviation[i] = d
+                if d > k:
+                    mask[i] = True
+        return mask, deviation
+
+
+def detect_zscore_anomalies(
+    records: Iterable[Tuple],
+    threshold_multiplier: float,
+    min_group_size: int = 5,
+    top_k: int = 50,
+) -> Tuple[int, List[dict]]:
+    """Flag values outside mean +/- k*std per (equipment, sensor type) group.
+
+    Takes (equipment_id, sensor_type, value, timestamp) tuples and returns
+    (total points analyzed, top anomalies ordered by deviation).
+    """
+    df = pd.DataFrame.from_records(records, columns=_COLUMNS)
+    total_points = len(df)
+
+    if total_points == 0:
+        return 0, []
+
+    values = df["value"].to_numpy(dtype=np.float64)
+
+    if _HAS_NUMBA:
+        # LLVM-compiled kernel: single-pass group stats, parallel outlier flagging
+        codes = df.groupby(["equipment_id", "sensor_type"]).ngroup().to_numpy(dtype=np.int64)
+        group_counts, group_mean, group_std = _group_stats(codes, values, int(codes.max()) + 1)
+        mask, deviation = _flag_outliers(
+            codes, values, group_counts, group_mean, group_std,
+            threshold_multiplier, min_group_size
+        )
+        mean = group_mean[codes]
+        std = group_std[codes]
+    else:
+        grouped = df.groupby(["equipment_id", "sensor_type"])["value"]
+        mean = grouped.transform("mean").to_numpy()
+        std = grouped.transform("std", ddof=0).to_numpy()
+        counts = grouped.transform("size").to_numpy()
+
+        abs_dev = np.abs(values - mean)
+
+        # Boolean mask over the whole batch — no per-point Python loop
+        valid = (counts >= min_group_size) & (std > 0)
+        mask = valid & (abs_dev > threshold_multiplier * std)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            deviation = np.where(std > 0, abs_dev / std, 0.0)
+
+    if not mask.any():
+        return total_points, []
+
+    flagged = df.loc[mask, ["equipment_id", "sensor_type", "value", "timestamp"]].copy()
+    flagged["mean"] = mean[mask]
+    flagged["std"] = std[mask]
+    flagged["deviation"] = deviation[mask]
+    flagged = flagged.sort_values("deviation", ascending=False).head(top_k)
+
+    return total_points, _format_anomalies(flagged, threshold_multiplier)
+
+
+def _format_anomalies(flagged: pd.DataFrame, threshold_multiplier: float) -> List[dict]:
+    """Serialize ranked flagged rows into the API's anomaly payloads"""
+    anomalies = []
+    for row in flagged.itertuples(index=False):
+        threshold = threshold_multiplier * row.std
+        anomalies.append({
+            "equipment_id": row.equipment_id,
+            "sensor_type": row.sensor_type,
+            "value": row.value,
+            "expected_range": [row.mean - threshold, row.mean + threshold],
+            "deviation": float(row.deviation),
+            "timestamp": row.timestamp,
+            "severity": "HIGH" if abs(row.value - row.mean) > 3 * row.std else "MEDIUM"
+        })
+    return anomalies
+
+
+class StreamingZScoreDetector:
+    """Two-pass streaming variant of detect_zscore_anomalies.
+
+    For result sets too large to materialize, the caller streams the same
+    query twice: fold() accumulates per-group count/sum/sum-of-squares,
+    finalize_stats() turns the accumulators into mean/std, and flag()
+    checks each partition against them, compacting the flagged working
+    set down to the top rows whenever it grows. Peak memory is one
+    partition plus the per-group accumulators, never the full result set.
+    """
+
+    # Compact the flagged working set once it exceeds this many rows
+    _COMPACT_AT = 1000
+
+    def __init__(
+        self,
+        threshold_multiplier: float,
+        min_group_size: int = 5,
+        top_k: int = 50,
+    ):
+        self.threshold_multiplier = threshold_multiplier
+        self.min_group_size = min_group_size
+        self.top_k = top_k
+        self.total_points = 0
+        self._acc: dict = {}
+        self._stats: Optional[pd.DataFrame] = None
+        self._flagged: List[pd.DataFrame] = []
+        self._flagged_rows = 0
+
+    def fold(self, records: Iterable[Tuple]):
+        """Fold one partition into the per-group accumulators (pass one)"""
+        df = pd.DataFrame.from_records(records, columns=_COLUMNS)
+        if df.empty:
+            return
+        self.total_points += len(df)
+        values = df["value"].astype(np.float64)
+        grouped = pd.DataFrame({
+            "count": values,
+            "total": values,
+            "sum_sq": values * values,
+        }).groupby([df["equipment_id"], df["sensor_type"]]).agg({
+            "count": "size", "total": "sum", "sum_sq": "sum"
+        })
+        for key, count, total, sum_sq in grouped.itertuples():
+            entry = self._acc.setdefault(key, [0, 0.0, 0.0])
+            entry[0] += count
+            entry[1] += total
+            entry[2] += sum_sq
+
+    def finalize_stats(self):
+        """Turn the accumulators into per-group mean/std, dropping groups
+        below the size or variance gates (same gating as the batch kernel)"""
+        if not self._acc:
+            self._stats = pd.DataFrame(
+                columns=["equipment_id", "sensor_type", "mean", "std"]
+            )
+            return
+        index = pd.MultiIndex.from_tuples(
+            self._acc.keys(), names=["equipment_id", "sensor_type"]
+        )
+        stats = pd.DataFrame(
+            list(self._acc.values()), index=index,
+            columns=["count", "total", "sum_sq"]
+        )
+        stats["mean"] = stats["total"] / stats["count"]
+        stats["std"] = np.sqrt(
+            (stats["sum_sq"] / stats["count"] - stats["mean"] ** 2).clip(lower=0)
+        )
+        stats = stats[(stats["count"] >= self.min_group_size) & (stats["std"] > 0)]
+        self._stats = stats[["mean", "std"]].reset_index()
+
+    def flag(self, records: Iterable[Tuple]):
+        """Flag one partition's rows outside the threshold band (pass two)"""
+        df = pd.DataFrame.from_records(records, columns=_COLUMNS)
+        if df.empty or self._stats is None or self._stats.empty:
+            return
+        merged = df.merge(self._stats, on=["equipment_id", "sensor_type"], how="inner")
+        if merged.empty:
+            return
+        abs_dev = np.abs(merged["value"].to_numpy(dtype=np.float64) - merged["mean"].to_numpy())
+        std = merged["std"].to_numpy()
+        merged["deviation"] = abs_dev / std
+        flagged = merged[abs_dev > self.threshold_multiplier * std]
+        if flagged.empty:
+            return
+        self._flagged.append(flagged)
+        self._flagged_rows += len(flagged)
+        if self._flagged_rows > self._COMPACT_AT:
+            compacted = pd.concat(self._flagged).nlargest(self.top_k, "deviation")
+            self._flagged = [compacted]
+            self._flagged_rows = len(compacted)
+
+    def result(self) -> Tuple[int, List[dict]]:
+        """Return (total points analyzed, top anomalies by deviation)"""
+        if not self._flagged:
+            return self.total_points, []
+        flagged = pd.concat(self._flagged).nlargest(self.top_k, "deviation")
+        return self.total_points, _format_anomalies(flagged, self.threshold_multiplier)
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, text
+
+from app.core.config import settings
+from app.database.connection import AsyncSessionLocal
+from app.models import Equipment, Sensor, SensorData
+
+logger = logging.getLogger("ingest")
+
+# Flush whatever has queued at least this often, even when the batch is short
+FLUSH_INTERVAL_SECONDS = 0.25
+
+# Heartbeats only need to be fresh to within the health-check window, so
+# they are written far less often than data batches
+HEARTBEAT_FLUSH_SECONDS = 5.0
+
+# Column order for COPY bulk loads; unlisted columns take their defaults.
+# is_processed/is_anomaly carry Python-side defaults, so they are written
+# explicitly to match what the INSERT path produces
+_COPY_COLUMNS = (
+    "equipment_id", "sensor_id", "value", "quality", "timestamp",
+    "is_processed", "is_anomaly", "source_protocol"
+)
+
+def _build_copy_records(rows: List[dict]) -> List[tuple]:
+    """Turn row dicts into COPY record tuples (module-level so it pickles
+    for the optional process pool)"""
+    return [
+        (
+            row["equipment_id"], row["sensor_id"], row["value"],
+            row["quality"], row["timestamp"], False, False,
+            row["source_protocol"]
+        )
+        for row in rows
+    ]
+
+class SensorIngestWriter:
+    """Batched writer for the sensor-data ingest hot path.
+
+    Protocol clients enqueue one dict per sample (equipment_id, sensor_type,
+    value, timestamp, quality); a background task drains the queue and writes
+    each batch in a single transaction. This amortizes the per-message
+    round-trips and commit fsyncs that the old per-sample store path paid —
+    one message used to cost two SELECTs and two commits.
+    """
+
+    def __init__(self, source_protocol: str):
+        self.source_protocol = source_protocol
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
+        self._flusher_task: Optional[asyncio.Task] = None
+        # Process-local key caches: equipment and sensor rows are almost
+        # static, so resolving them per batch is round-trip overhead. Loaded
+        # once on the first flush, then extended on miss (new registrations)
+        self._equipment_pk: Dict[str, int] = {}
+        self._sensor_pk: Dict[Tuple[int, str], int] = {}
+        self._caches_loaded = False
+        # Latest sample timestamp per equipment pk, drained by the
+        # heartbeat flusher — no per-batch heartbeat write
+        self._last_seen: Dict[int, datetime] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # Optional process pool keeping batch serialization off the event
+        # loop (and off the GIL) — see INGEST_SERIALIZE_WORKERS
+        self._serialize_pool: Optional[ProcessPoolExecutor] = None
+        # Cleared on the first backend that rejects SET LOCAL
+        self._relax_commit_ok = True
+
+    def start(self):
+        """Start the background flush tasks (idempotent)"""
+        if self._flusher_task is None:
+            self._flusher_task = asyncio.create_task(self._flush_loop())
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_flush_loop())
+        if settings.INGEST_SERIALIZE_WORKERS > 0 and self._serialize_pool is None:
+            self._serialize_pool = ProcessPoolExecutor(
+                max_workers=settings.INGEST_SERIALIZE_WORKERS
+            )
+
+    async def stop(self):
+        """Stop the background flush tasks"""
+        if self._flusher_task:
+            self._flusher_task.cancel()
+            self._flusher_task = None
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        if self._serialize_pool:
+            self._serialize_pool.shutdown(wait=False)
+            self._serialize_pool = None
+
+    async def put(self, sample: dict):
+        """Queue a sample; applies backpressure (awaits) when the queue is full"""
+        await self._queue.put(sample)
+
+    async def _flush_loop(self):
+        """Collect samples into batches and flush them to the database"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # Block for the first sample, then coalesce until the batch
+                # fills or the flush interval elapses
+                batch = [await self._queue.get()]
+                deadline = loop.time() + FLUSH_INTERVAL_SECONDS
+                while len(batch) < settings.BATCH_SIZE:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+
+                await self._flush_batch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing {self.source_protocol} ingest batch: {e}")
+                await asyncio.sleep(0.1)
+
+    async def _load_key_caches(self, db):
+        """Load the full equipment/sensor key mappings in two queries"""
+        self._equipment_pk = dict((await db.execute(
+            select(Equipment.equipment_id, Equipment.id)
+        )).all())
+        self._sensor_pk = {
+            (equipment_pk, sensor_type): pk
+            for equipment_pk, sensor_type, pk in (await db.execute(
+                select(Sensor.equipment_id, Sensor.type, Sensor.id)
+            )).all()
+        }
+        self._caches_loaded = True
+        logger.info(
+            f"Loaded {len(self._equipment_pk)} equipment and "
+            f"{len(self._sensor_pk)} sensor keys for {self.source_protocol} ingest"
+        )
+
+    async def _resolve_misses(self, db, batch: List[dict]):
+        """Re-query keys for batch entries missing from the caches.
+
+        Covers equipment or sensors registered after the caches were loaded;
+        unknown IDs stay unresolved and their samples are dropped with a
+        warning, matching the old per-message behaviour.
+        """
+        missing_equipment = {
+            s["equipment_id"] for s in batch
+            if s["equipment_id"] not in self._equipment_pk
+        }
+        if missing_equipment:
+            self._equipment_pk.update((await db.execute(
+                select(Equipment.equipment_id, Equipment.id).where(
+                    Equipment.equipment_id.in_(missing_equipment)
+                )
+            )).all())
+
+        missing_sensors = {
+            (equipment_pk, s["sensor_type"])
+            for s in batch
+            if (equipment_pk := self._equipment_pk.get(s["equipment_id"])) is not None
+            and (equipment_pk, s["sensor_type"]) not in self._sensor_pk
+        }
+        if missing_sensors:
+            self._sensor_pk.update({
+                (equipment_pk, sensor_type): pk
+                for equipment_pk, sensor_type, pk in (await db.execute(
+                    select(Sensor.equipment_id, Sensor.type, Sensor.id).where(
+                        Sensor.equipment_id.in_({e for e, _ in missing_sensors}),
+                        Sensor.type.in_({t for _, t in missing_sensors})
+                    )
+                )).all()
+            })
+
+    async def _relax_durability(self, db):
+        """Turn off synchronous_commit for this transaction when configured.
+
+        Telemetry tolerates losing the last instants of data on a crash;
+        skipping the per-commit WAL fsync is a large ingest win. Backends
+        that reject the SET LOCAL disable further attempts.
+        """
+        if settings.INGEST_SYNCHRONOUS_COMMIT or not self._relax_commit_ok:
+            return
+        try:
+            await db.execute(text("SET LOCAL synchronous_commit = off"))
+        except Exception as e:
+            self._relax_commit_ok = False
+            await db.rollback()
+            logger.warning(f"synchronous_commit=off unsupported, keeping durable commits: {e}")
+
+    async def _flush_batch(self, batch: List[dict]):
+        """Write one batch of samples in a single transaction"""
+        async with AsyncSessionLocal() as db:
+            await self._relax_durability(db)
+            if not self._caches_loaded:
+                await self._load_key_caches(db)
+            await self._resolve_misses(db, batch)
+
+            # One clock read per batch; samples without their own timestamp
+            # (sender omitted it) are stamped with the batch time. Aware
+            # UTC, matching _parse_timestamp, so rows never mix naive and
+            # aware datetimes
+            now = datetime.now(timezone.utc)
+            rows = []
+            for sample in batch:
+                equipment_pk = self._equipment_pk.get(sample["equipment_id"])
+                if equipment_pk is None:
+                    logger.warning(f"Equipment not found: {sample['equipment_id']}")
+                    continue
+
+                sensor_pk = self._sensor_pk.get((equipment_pk, sample["sensor_type"]))
+                if sensor_pk is None:
+                    logger.warning(f"Sensor not found: {sample['equipment_id']}/{sample['sensor_type']}")
+                    continue
+
+                timestamp = sample["timestamp"] or now
+                rows.append({
+                    "equipment_id": equipment_pk,
+                    "sensor_id": sensor_pk,
+                    "value": sample["value"],
+                    "quality": sample["quality"],
+                    "timestamp": timestamp,
+                    "source_protocol": self.source_protocol
+                })
+                # Heartbeats track receive time, not the device-supplied
+                # sample timestamp — a device backfilling historical data
+                # is still alive. The flusher writes these on its own cadence
+                self._last_seen[equipment_pk] = now
+
+            if rows and not await self._copy_rows(db, rows):
+                # COPY failure aborts the transaction; retry as a plain
+                # Core executemany INSERT on a fresh one
+                await db.rollback()
+                await db.execute(SensorData.__table__.insert(), rows)
+
+            await db.commit()
+
+            logger.debug(f"Flushed {len(rows)} {self.source_protocol} samples")
+
+    async def _copy_rows(self, db, rows: List[dict]) -> bool:
+        """Bulk-load a batch with COPY ... FROM STDIN on the raw asyncpg
+        connection — substantially faster than INSERT for bulk appends.
+
+        Returns False when the driver does not support it (non-asyncpg
+        backends) or the COPY fails; the caller falls back to INSERT.
+        """
+        try:
+            raw = await (await db.connection()).get_raw_connection()
+            driver = getattr(raw, "driver_connection", None)
+            if driver is None or not hasattr(driver, "copy_records_to_table"):
+                return False
+
+            if self._serialize_pool is not None:
+                records = await asyncio.get_running_loop().run_in_executor(
+                    self._serialize_pool, _build_copy_records, rows
+                )
+            else:
+                records = _build_copy_records(rows)
+
+            await driver.copy_records_to_table(
+                SensorData.__tablename__,
+                records=records,
+                columns=list(_COPY_COLUMNS)
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"COPY bulk load failed, falling back to INSERT: {e}")
+            return False
+
+    async def _heartbeat_flush_loop(self):
+        """Write coalesced equipment heartbeats every few seconds.
+
+        Bumping last_heartbeat per message doubled the write TPS just to
+        refresh a timestamp; one executemany UPDATE per interval covers
+        every equipment seen since the last flush.
+        """
+        while True:
+            try:
+                await asyncio.sleep(HEARTBEAT_FLUSH_SECONDS)
+                if not self._last_seen:
+                    continue
+                seen, self._last_seen = self._last_seen, {}
+                await self._flush_heartbeats(seen)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing {self.source_protocol} heartbeats: {e}")
+
+    async def _flush_heartbeats(self, seen: Dict[int, datetime]):
+        """Apply the coalesced heartbeat updates in one statement"""
+        async with AsyncSessionLocal() as db:
+            await self._relax_durability(db)
+            await db.execute(
+                Equipment.__table__.update().where(
+                    Equipment.id == bindparam("b_id")
+                ).values(last_heartbeat=bindparam("b_ts"), is_connected=True),
+                [{"b_id": pk, "b_ts": ts} for pk, ts in seen.items()]
+            )
+            await db.commit()
@@ -1,26 +1,73 @@
 import asyncio
-import json
 import logging
-from datetime import datetime
+import re
+from datetime import datetime, timezone
 from typing import Dict, List, Optional, Callable
 import aiomqtt
+import orjson
 from app.core.config import settings
-from app.database.connection import SessionLocal
-from app.models import Equipment, SensorData, Sensor
+from app.services.protocols.ingest import SensorIngestWriter
 
 logger = logging.getLogger("mqtt")
 
+try:
+    # C-extension ISO-8601 parser, much faster than datetime.fromisoformat
+    # and tolerant of the trailing 'Z' that fromisoformat rejects
+    from ciso8601 import parse_datetime as _parse_iso
+except ImportError:
+    def _parse_iso(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def _parse_timestamp(ts) -> Optional[datetime]:
+    """Parse a payload timestamp, or None when the sender omitted it.
+
+    Numeric timestamps are treated as epoch seconds (milliseconds when
+    implausibly large) — no string parsing at all on that path. Always
+    returns aware UTC so the ingest flusher never compares mixed naive
+    and aware datetimes within a batch.
+    """
+    if ts is None:
+        return None
+    if isinstance(ts, (int, float)):
+        if ts > 1e12:  # epoch milliseconds
+            ts /= 1000.0
+        return datetime.fromtimestamp(ts, tz=timezone.utc)
+    parsed = _parse_iso(ts)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
 class MQTTService:
     """MQTT client for industrial equipment data collection"""
-    
+
+    # Topics look like "equipment/<equipment_id>/<sensor_type>[/...]"; one
+    # precompiled match extracts both parts in C with no throwaway list
+    _TOPIC_RE = re.compile(r"^[^/]+/([^/]+)/([^/]+)")
+
     def __init__(self):
         self.client: Optional[aiomqtt.Client] = None
         self.is_connected = False
         self.subscribed_topics: List[str] = []
         self.message_handlers: Dict[str, Callable] = {}
+        # Outbound commands are queued and flushed by a single background
+        # task, amortizing per-message overhead under publish load
+        self._publish_queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
+        self._flusher_task: Optional[asyncio.Task] = None
+        # Incoming samples are queued and written in batches — one
+        # transaction per batch instead of two commits per message
+        self._ingest = SensorIngestWriter(source_protocol="MQTT")
+        # Bounded hand-off between the broker reader and the parser: when
+        # the DB falls behind, puts block the async-for over
+        # client.messages and TCP backpressure reaches the broker instead
+        # of memory growing without bound
+        self._message_queue: asyncio.Queue = asyncio.Queue(maxsize=5000)
+        self._consumer_tasks: List[asyncio.Task] = []
         
-    async def connect(self):
-        """Connect to MQTT broker"""
+    async def connect(self, subscribe: bool = True):
+        """Connect to MQTT broker.
+
+        With subscribe=False only the outbound publish path is set up —
+        the mode the API process uses, leaving topic subscriptions and
+        sensor ingestion to the ingestion daemon.
+        """
         try:
             self.client = aiomqtt.Client(
                 hostname=settings.MQTT_BROKER_HOST,
@@ -34,11 +81,23 @@ class MQTTService:
             self.is_connected = True
             logger.info(f"Connected to MQTT broker at {settings.MQTT_BROKER_HOST}:{settings.MQTT_BROKER_PORT}")
             
-            # Subscribe to configured topics
-            await self._subscribe_to_topics()
-            
-            # Start message processing
-            asyncio.create_task(self._process_messages())
+            if subscribe:
+                # Subscribe to configured topics
+                await self._subscribe_to_topics()
+
+                # Start message processing and a pool of consumers sharing the
+                # hand-off queue — bursts parse concurrently with DB flushes
+                asyncio.create_task(self._process_messages())
+                self._consumer_tasks = [
+                    asyncio.create_task(self._consume_messages())
+                    for _ in range(settings.MQTT_WORKERS)
+                ]
+
+                # Start the batched ingest writer
+                self._ingest.start()
+
+            # Start the outbound publish flusher
+            self._flusher_task = asyncio.create_task(self._publish_flusher())
             
         except Exception as e:
             logger.error(f"Failed to connect to MQTT broker: {e}")
@@ -47,6 +106,13 @@ class MQTTService:
     
     async def disconnect(self):
         """Disconnect from MQTT broker"""
+        if self._flusher_task:
+            self._flusher_task.cancel()
+            self._flusher_task = None
+        for task in self._consumer_tasks:
+            task.cancel()
+        self._consumer_tasks = []
+        await self._ingest.stop()
         if self.client and self.is_connected:
             try:
                 await self.client.__aexit__(None, None, None)
@@ -66,98 +132,122 @@ class MQTTService:
                 logger.error(f"Failed to subscribe to topic {topic}: {e}")
     
     async def _process_messages(self):
-        """Process incoming MQTT messages"""
+        """Feed incoming MQTT messages into the bounded hand-off queue"""
         try:
             async for message in self.client.messages:
-                await self._handle_message(message)
+                await self._message_queue.put(message)
         except Exception as e:
             logger.error(f"Error processing MQTT messages: {e}")
+
+    async def _consume_messages(self):
+        """Drain the hand-off queue through the message handler"""
+        while True:
+            message = await self._message_queue.get()
+            try:
+                await self._handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error consuming MQTT message: {e}")
     
     async def _handle_message(self, message):
         """Handle individual MQTT message"""
         try:
             # Parse topic to extract equipment and sensor info
-            topic_parts = message.topic.value.split('/')
-            if len(topic_parts) >= 3:
-                equipment_id = topic_parts[1]
-                sensor_type = topic_parts[2]
-                
-                # Parse message payload
-                payload = json.loads(message.payload.decode())
-                
+            match = self._TOPIC_RE.match(message.topic.value)
+            if match:
+                equipment_id, sensor_type = match.groups()
+
+                # Parse message payload — orjson accepts the raw bytes, so
+                # no intermediate .decode() string either
+                payload = orjson.loads(message.payload)
+
+                # SenML batch: one frame carries N readings
+                if 'e' in payload:
+                    await self._handle_senml(equipment_id, sensor_type, payload)
+                    return
+
                 # Extract sensor data
                 value = payload.get('value')
-                timestamp = payload.get('timestamp', datetime.utcnow().isoformat())
+                timestamp = _parse_timestamp(payload.get('timestamp'))
                 quality = payload.get('quality', 'GOOD')
-                
+
                 if value is not None:
-                    await self._store_sensor_data(
-                        equipment_id=equipment_id,
-                        sensor_type=sensor_type,
-                        value=float(value),
-                        timestamp=datetime.fromisoformat(timestamp.replace('Z', '+00:00')),
-                        quality=quality,
-                        source_protocol='MQTT'
-                    )
-                
+                    await self._ingest.put({
+                        "equipment_id": equipment_id,
+                        "sensor_type": sensor_type,
+                        # orjson already yields floats; skip the re-boxing
+                        "value": value if type(value) is float else float(value),
+                        # None defers to the flusher's per-batch clock read
+                        "timestamp": timestamp,
+                        "quality": quality
+                    })
+
         except Exception as e:
             logger.error(f"Error handling MQTT message from {message.topic}: {e}")
-    
-    async def _store_sensor_data(self, equipment_id: str, sensor_type: str, 
-                               value: float, timestamp: datetime, quality: str, 
-                               source_protocol: str):
-        """Store sensor data in database"""
-        try:
-            with SessionLocal() as db:
-                # Find equipment
-                equipment = db.query(Equipment).filter(
-                    Equipment.equipment_id == equipment_id
-                ).first()
-                
-                if not equipment:
-                    logger.warning(f"Equipment not found: {equipment_id}")
-                    return
-                
-                # Find sensor
-                sensor = db.query(Sensor).filter(
-                    Sensor.equipment_id == equipment.id,
-                    Sensor.type == sensor_type
-                ).first()
-                
-                if not sensor:
-                    logger.warning(f"Sensor not found: {equipment_id}/{sensor_type}")
-                    return
-                
-                # Create sensor data record
-                sensor_data = SensorData(
-                    equipment_id=equipment.id,
-                    sensor_id=sensor.id,
-                    value=value,
-                    quality=quality,
-                    timestamp=timestamp,
-                    source_protocol=source_protocol
-                )
-                
-                db.add(sensor_data)
-                db.commit()
-                
-                # Update equipment heartbeat
-                equipment.last_heartbeat = datetime.utcnow()
-                equipment.is_connected = True
-                db.commit()
-                
-                logger.debug(f"Stored sensor data: {equipment_id}/{sensor_type} = {value}")
-                
-        except Exception as e:
-            logger.error(f"Error storing sensor data: {e}")
-    
+
+    async def _handle_senml(self, equipment_id: str, default_sensor_type: str, payload: dict):
+        """Fan a SenML record array into the ingest queue.
+
+        One frame amortizes the MQTT/TCP and JSON-parse overhead over N
+        readings: 'bt' is the base time (epoch seconds), each record adds
+        an offset 't' and may name its own measurement 'n'; records
+        without a name fall back to the topic's sensor type.
+        """
+        base_time = payload.get('bt')
+        for reading in payload.get('e', []):
+            value = reading.get('v')
+            if value is None:
+                continue
+
+            if base_time is not None:
+                timestamp = datetime.fromtimestamp(base_time + reading.get('t', 0), tz=timezone.utc)
+            else:
+                timestamp = None  # stamped with the flusher's batch time
+
+            await self._ingest.put({
+                "equipment_id": equipment_id,
+                "sensor_type": reading.get('n') or default_sensor_type,
+                "value": value if type(value) is float else float(value),
+                "timestamp": timestamp,
+                "quality": 'GOOD'
+            })
+
+    async def enqueue_publish(self, topic: str, message: str):
+        """Queue an outbound message for the background flusher.
+
+        Applies backpressure (awaits) when the queue is full instead of
+        dropping messages.
+        """
+        await self._publish_queue.put((topic, message))
+
+    async def _publish_flusher(self):
+        """Drain the publish queue in batches"""
+        while True:
+            try:
+                batch = [await self._publish_queue.get()]
+                # Coalesce whatever else is already waiting
+                while len(batch) < 500:
+                    try:
+                        batch.append(self._publish_queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+
+                for topic, message in batch:
+                    await self.client.publish(topic, message, qos=settings.MQTT_QOS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error flushing MQTT publish queue: {e}")
+                await asyncio.sleep(0.1)
+
     async def publish_command(self, equipment_id: str, command: str, payload: dict):
         """Publish command to equipment"""
         if not self.is_connected or not self.client:
             raise Exception("MQTT client not connected")
         
         topic = f"equipment/{equipment_id}/command/{command}"
-        message = json.dumps(payload)
+        message = orjson.dumps(payload)  # bytes — aiomqtt publishes them as-is
         
         try:
             await self.client.publish(topic, message, qos=settings.MQTT_QOS)
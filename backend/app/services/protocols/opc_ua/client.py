@@ -1,12 +1,14 @@
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from asyncua import Client, ua
 from asyncua.common.subscription import SubHandler
+from sqlalchemy import select
 from app.core.config import settings
-from app.database.connection import SessionLocal
-from app.models import Equipment, SensorData, Sensor
+from app.database.connection import AsyncSessionLocal
+from app.models import Equipment
+from app.services.protocols.ingest import SensorIngestWriter
 
 logger = logging.getLogger("opcua")
 
@@ -19,11 +21,9 @@ class OPCUASubscriptionHandler(SubHandler):
     async def datachange_notification(self, node, val, data):
         """Handle data change notifications"""
         try:
-            node_id = str(node)
-            timestamp = datetime.utcnow()
-            
-            # Parse node ID to extract equipment and sensor info
-            await self.opcua_service._process_node_data(node_id, val, timestamp)
+            # None defers timestamping to the ingest flusher's per-batch
+            # clock read — no gettimeofday per notification
+            await self.opcua_service._process_node_data(str(node), val, None)
             
         except Exception as e:
             logger.error(f"Error processing OPC UA data change: {e}")
@@ -36,12 +36,24 @@ class OPCUAService:
         self.is_connected = False
         self.subscription = None
         self.monitored_nodes: Dict[str, Any] = {}
+        # node_id string -> Node: get_node() re-parses the NodeId and builds
+        # a fresh object on every call, so cache them per connection
+        self._node_cache: Dict[str, Any] = {}
+        # Incoming samples are queued and written in batches — one
+        # transaction per batch instead of two commits per data change
+        self._ingest = SensorIngestWriter(source_protocol="OPC_UA")
         
-    async def connect(self):
-        """Connect to OPC UA server"""
+    async def connect(self, monitor: bool = True):
+        """Connect to OPC UA server.
+
+        With monitor=False no subscriptions are created and the ingest
+        writer stays idle — the mode the API process uses for node
+        read/write/browse, leaving ingestion to the ingestion daemon.
+        """
         try:
             self.client = Client(url=settings.OPC_UA_ENDPOINT)
-            
+            self._node_cache.clear()  # nodes belong to the previous client
+
             # Set security policy if specified
             if settings.OPC_UA_SECURITY_POLICY != "None":
                 await self.client.set_security_string(
@@ -58,9 +70,13 @@ class OPCUAService:
             self.is_connected = True
             logger.info(f"Connected to OPC UA server at {settings.OPC_UA_ENDPOINT}")
             
-            # Setup subscriptions
-            await self._setup_subscriptions()
-            
+            if monitor:
+                # Setup subscriptions
+                await self._setup_subscriptions()
+
+                # Start the batched ingest writer
+                self._ingest.start()
+
         except Exception as e:
             logger.error(f"Failed to connect to OPC UA server: {e}")
             self.is_connected = False
@@ -68,6 +84,7 @@ class OPCUAService:
     
     async def disconnect(self):
         """Disconnect from OPC UA server"""
+        await self._ingest.stop()
         if self.client and self.is_connected:
             try:
                 if self.subscription:
@@ -97,49 +114,62 @@ class OPCUAService:
     async def _setup_equipment_monitoring(self):
         """Setup monitoring for OPC UA equipment"""
         try:
-            with SessionLocal() as db:
+            async with AsyncSessionLocal() as db:
                 # Get all OPC UA equipment
-                equipment_list = db.query(Equipment).filter(
+                equipment_list = (await db.scalars(select(Equipment).where(
                     Equipment.protocol == "OPC_UA",
                     Equipment.is_active == True
-                ).all()
-                
-                for equipment in equipment_list:
-                    await self._monitor_equipment(equipment)
-                    
+                ))).all()
+
+            # Collect every node across all equipment first, then create all
+            # monitored items in one CreateMonitoredItems service call —
+            # one server round-trip instead of one per node
+            pending = []
+            for equipment in equipment_list:
+                pending.extend(self._collect_equipment_nodes(equipment))
+
+            if not pending:
+                return
+
+            handles = await self.subscription.subscribe_data_change(
+                [entry['node'] for entry in pending]
+            )
+            if not isinstance(handles, list):
+                handles = [handles]
+
+            for entry, handle in zip(pending, handles):
+                entry['handle'] = handle
+                self.monitored_nodes[entry.pop('node_id')] = entry
+
+            logger.info(f"Monitoring {len(pending)} OPC UA nodes across {len(equipment_list)} equipment")
+
         except Exception as e:
             logger.error(f"Error setting up equipment monitoring: {e}")
+
+    def _collect_equipment_nodes(self, equipment):
+        """Gather the configured nodes for one equipment (no server calls)"""
+        config = equipment.connection_config or {}
+        entries = []
+        for node_config in config.get('node_ids', []):
+            node_id = node_config.get('node_id')
+            if node_id:
+                entries.append({
+                    'node_id': node_id,
+                    'equipment_id': equipment.equipment_id,
+                    'sensor_type': node_config.get('sensor_type'),
+                    'node': self._node(node_id)
+                })
+        return entries
+
+    def _node(self, node_id: str):
+        """Get the cached Node object for a node id string"""
+        node = self._node_cache.get(node_id)
+        if node is None:
+            node = self.client.get_node(node_id)
+            self._node_cache[node_id] = node
+        return node
     
-    async def _monitor_equipment(self, equipment):
-        """Monitor specific equipment nodes"""
-        try:
-            config = equipment.connection_config or {}
-            node_ids = config.get('node_ids', [])
-            
-            for node_config in node_ids:
-                node_id = node_config.get('node_id')
-                sensor_type = node_config.get('sensor_type')
-                
-                if node_id:
-                    # Get node object
-                    node = self.client.get_node(node_id)
-                    
-                    # Create monitored item
-                    handle = await self.subscription.subscribe_data_change(node)
-                    
-                    self.monitored_nodes[node_id] = {
-                        'equipment_id': equipment.equipment_id,
-                        'sensor_type': sensor_type,
-                        'handle': handle,
-                        'node': node
-                    }
-                    
-                    logger.info(f"Monitoring OPC UA node: {node_id} for equipment {equipment.equipment_id}")
-                    
-        except Exception as e:
-            logger.error(f"Error monitoring equipment {equipment.equipment_id}: {e}")
-    
-    async def _process_node_data(self, node_id: str, value: Any, timestamp: datetime):
+    async def _process_node_data(self, node_id: str, value: Any, timestamp: Optional[datetime]):
         """Process data from monitored node"""
         try:
             node_info = self.monitored_nodes.get(node_id)
@@ -149,133 +179,122 @@ class OPCUAService:
             equipment_id = node_info['equipment_id']
             sensor_type = node_info['sensor_type']
             
-            # Convert value to float if possible
-            if isinstance(value, (int, float)):
+            # Convert value to float if possible — exact-type fast path
+            # first, since most servers deliver plain floats
+            if type(value) is float:
+                numeric_value = value
+            elif isinstance(value, (int, float)):
                 numeric_value = float(value)
             else:
-                # Try to convert string to float
                 try:
-                    numeric_value = float(str(value))
-                except ValueError:
-                    logger.warning(f"Cannot convert OPC UA value to numeric: {value}")
-                    return
-            
-            await self._store_sensor_data(
-                equipment_id=equipment_id,
-                sensor_type=sensor_type,
-                value=numeric_value,
-                timestamp=timestamp,
-                quality='GOOD',
-                source_protocol='OPC_UA'
-            )
+                    numeric_value = float(value)
+                except (TypeError, ValueError):
+                    # Last resort for variant wrappers with numeric repr
+                    try:
+                        numeric_value = float(str(value))
+                    except ValueError:
+                        logger.warning(f"Cannot convert OPC UA value to numeric: {value}")
+                        return
             
+            await self._ingest.put({
+                "equipment_id": equipment_id,
+                "sensor_type": sensor_type,
+                "value": numeric_value,
+                "timestamp": timestamp,
+                "quality": 'GOOD'
+            })
+
         except Exception as e:
             logger.error(f"Error processing OPC UA node data: {e}")
-    
-    async def _store_sensor_data(self, equipment_id: str, sensor_type: str, 
-                               value: float, timestamp: datetime, quality: str, 
-                               source_protocol: str):
-        """Store sensor data in database"""
-        try:
-            with SessionLocal() as db:
-                # Find equipment
-                equipment = db.query(Equipment).filter(
-                    Equipment.equipment_id == equipment_id
-                ).first()
-                
-                if not equipment:
-                    logger.warning(f"Equipment not found: {equipment_id}")
-                    return
-                
-                # Find sensor
-                sensor = db.query(Sensor).filter(
-                    Sensor.equipment_id == equipment.id,
-                    Sensor.type == sensor_type
-                ).first()
-                
-                if not sensor:
-                    logger.warning(f"Sensor not found: {equipment_id}/{sensor_type}")
-                    return
-                
-                # Create sensor data record
-                sensor_data = SensorData(
-                    equipment_id=equipment.id,
-                    sensor_id=sensor.id,
-                    value=value,
-                    quality=quality,
-                    timestamp=timestamp,
-                    source_protocol=source_protocol
-                )
-                
-                db.add(sensor_data)
-                db.commit()
-                
-                # Update equipment heartbeat
-                equipment.last_heartbeat = datetime.utcnow()
-                equipment.is_connected = True
-                db.commit()
-                
-                logger.debug(f"Stored OPC UA data: {equipment_id}/{sensor_type} = {value}")
-                
-        except Exception as e:
-            logger.error(f"Error storing OPC UA sensor data: {e}")
-    
+
     async def read_node_value(self, node_id: str):
         """Read current value from OPC UA node"""
         if not self.is_connected or not self.client:
             raise Exception("OPC UA client not connected")
         
         try:
-            node = self.client.get_node(node_id)
+            node = self._node(node_id)
             value = await node.read_value()
             return value
         except Exception as e:
             logger.error(f"Error reading OPC UA node {node_id}: {e}")
             raise
     
+    async def read_node_values(self, node_ids: List[str]):
+        """Read several nodes in a single OPC UA Read service call.
+
+        One round-trip regardless of count — use this over per-node
+        read_node_value when polling a set of nodes together.
+        """
+        if not self.is_connected or not self.client:
+            raise Exception("OPC UA client not connected")
+
+        try:
+            return await self.client.read_values([self._node(n) for n in node_ids])
+        except Exception as e:
+            logger.error(f"Error reading {len(node_ids)} OPC UA nodes: {e}")
+            raise
+
     async def write_node_value(self, node_id: str, value: Any):
         """Write value to OPC UA node"""
         if not self.is_connected or not self.client:
             raise Exception("OPC UA client not connected")
         
         try:
-            node = self.client.get_node(node_id)
+            node = self._node(node_id)
             await node.write_value(value)
             logger.info(f"Written value to OPC UA node {node_id}: {value}")
         except Exception as e:
             logger.error(f"Error writing to OPC UA node {node_id}: {e}")
             raise
     
+    async def write_node_values(self, items: List[Tuple[str, Any]]):
+        """Write several (node_id, value) pairs in a single Write service call"""
+        if not self.is_connected or not self.client:
+            raise Exception("OPC UA client not connected")
+
+        try:
+            nodes = [self._node(node_id) for node_id, _ in items]
+            values = [value for _, value in items]
+            await self.client.write_values(nodes, values)
+            logger.info(f"Written {len(items)} OPC UA node values in one batch")
+        except Exception as e:
+            logger.error(f"Error writing {len(items)} OPC UA nodes: {e}")
+            raise
+
     async def browse_nodes(self, parent_node_id: str = "i=85"):
         """Browse OPC UA server nodes"""
         if not self.is_connected or not self.client:
             raise Exception("OPC UA client not connected")
         
+        async def describe(child):
+            # Pipeline the attribute reads per child; gathering across
+            # children below overlaps them all on the one connection
+            display_name, node_class = await asyncio.gather(
+                child.read_display_name(),
+                child.read_node_class()
+            )
+            node_info = {
+                'node_id': str(child),
+                'display_name': display_name,
+                'node_class': node_class,
+                'data_type': None
+            }
+
+            # Get data type for variable nodes
+            if node_class == ua.NodeClass.Variable:
+                try:
+                    node_info['data_type'] = str(await child.read_data_type())
+                except:
+                    pass
+
+            return node_info
+
         try:
-            parent_node = self.client.get_node(parent_node_id)
+            parent_node = self._node(parent_node_id)
             children = await parent_node.get_children()
-            
-            nodes = []
-            for child in children:
-                node_info = {
-                    'node_id': str(child),
-                    'display_name': await child.read_display_name(),
-                    'node_class': await child.read_node_class(),
-                    'data_type': None
-                }
-                
-                # Get data type for variable nodes
-                if node_info['node_class'] == ua.NodeClass.Variable:
-                    try:
-                        data_type = await child.read_data_type()
-                        node_info['data_type'] = str(data_type)
-                    except:
-                        pass
-                
-                nodes.append(node_info)
-            
-            return nodes
-            
+            return list(await asyncio.gather(*(describe(child) for child in children)))
+
         except Exception as e:
             logger.error(f"Error browsing OPC UA nodes: {e}")
             raise
\ No newline at end of file
@@ -0,0 +1,29 @@
+"""Process-wide protocol service registry.
+
+Holds one MQTTService and one OPCUAService per process so request handlers
+reuse already-established broker/server connections instead of paying the
+TCP/TLS handshake on every call. Instances are created lazily on first use
+and shared by the lifespan hooks and the API endpoints.
+"""
+
+from app.services.protocols.mqtt.client import MQTTService
+from app.services.protocols.opc_ua.client import OPCUAService
+
+_mqtt_service = None
+_opcua_service = None
+
+
+def get_mqtt() -> MQTTService:
+    """Get the shared MQTT service for this process"""
+    global _mqtt_service
+    if _mqtt_service is None:
+        _mqtt_service = MQTTService()
+    return _mqtt_service
+
+
+def get_opcua() -> OPCUAService:
+    """Get the shared OPC UA service for this process"""
+    global _opcua_service
+    if _opcua_service is None:
+        _opcua_service = OPCUAService()
+    return _opcua_service
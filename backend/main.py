@@ -1,8 +1,9 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import uvicorn
 import asyncio
+import orjson
 from contextlib import asynccontextmanager
 
 from app.api.v1 import router as api_router
@@ -10,28 +11,33 @@ from app.core.config import settings
 from app.core.logging import setup_logging
 from app.middleware.error_handler import ErrorHandlerMiddleware
 from app.middleware.rate_limiter import RateLimiterMiddleware
-from app.services.protocols.mqtt.client import MQTTService
-from app.services.protocols.opc_ua.client import OPCUAService
-from app.database.connection import init_db
+from app.services.ingestion_daemon import STATUS_KEY as INGESTION_STATUS_KEY
+from app.services.protocols.registry import get_mqtt, get_opcua
+from app.database.connection import init_db, engine, async_engine, get_redis
+from app.database.rollups import rollup_refresh_loop
 
 # Initialize logging
 setup_logging()
 
-# Background services
-mqtt_service = MQTTService()
-opcua_service = OPCUAService()
+# Background services — shared process-wide instances from the registry
+mqtt_service = get_mqtt()
+opcua_service = get_opcua()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle events"""
-    # Startup
+    # Startup. Command/publish connections only — ingestion (topic
+    # subscriptions, monitored items and DB flushing) runs in the
+    # ingestion_daemon sidecar so its load never starves HTTP handlers
     await init_db()
-    await mqtt_service.connect()
-    await opcua_service.connect()
-    
+    await mqtt_service.connect(subscribe=False)
+    await opcua_service.connect(monitor=False)
+    rollup_task = asyncio.create_task(rollup_refresh_loop(engine))
+
     yield
-    
+
     # Shutdown
+    rollup_task.cancel()
     await mqtt_service.disconnect()
     await opcua_service.disconnect()
 
@@ -42,6 +48,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -58,13 +65,20 @@ app.add_middleware(
 app.add_middleware(ErrorHandlerMiddleware)
 app.add_middleware(RateLimiterMiddleware)
 
+# DEBUG only: per-request DB query counts to surface N+1 regressions
+if settings.DEBUG:
+    from app.middleware.query_counter import QueryCountMiddleware, instrument_engines
+
+    instrument_engines(engine, async_engine.sync_engine)
+    app.add_middleware(QueryCountMiddleware)
+
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
     """Root endpoint for health check"""
-    return JSONResponse({
+    return ORJSONResponse({
         "message": "Digital Twin Data Integration Platform API",
         "version": "1.0.0",
         "status": "active",
@@ -74,11 +88,22 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return JSONResponse({
+    # Ingestion runs in the sidecar; it reports via a TTL'd Redis key, so a
+    # dead or unreachable daemon reads as disconnected
+    ingestion = {"mqtt": False, "opc_ua": False}
+    try:
+        status = await get_redis().get(INGESTION_STATUS_KEY)
+        if status:
+            ingestion = orjson.loads(status)
+    except Exception:
+        pass
+
+    return ORJSONResponse({
         "status": "healthy",
         "services": {
             "mqtt": mqtt_service.is_connected,
             "opc_ua": opcua_service.is_connected,
+            "ingestion": ingestion,
             "database": True  # Add actual DB health check
         }
     })
@@ -89,5 +114,9 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        # reload and workers are mutually exclusive in uvicorn
+        workers=1 if settings.DEBUG else settings.WORKERS,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
\ No newline at end of file